@@ -1,11 +1,14 @@
 import os
-import time
+import queue
+import signal
+import random
+import threading
 from datetime import datetime
-import importlib
 import logging
 from modules.Database import ExposeDB, Expose
 from modules.EmailFetcher import EmailFetcher
-from modules.StealthBrowser import StealthBrowser
+from modules.ExposeWorker import ExposeWorker
+from modules.WorkerPool import WorkerPool
 
 
 
@@ -30,6 +33,27 @@ def init_log():    # Create logs directory if it doesn't exist
     )
 
 
+def fetch_emails_loop(email_processor, wake_queue, consumers, stop_event):
+    # Producer: keeps ingesting alerts while the browsers work, and wakes the workers up
+    try:
+        while not stop_event.is_set():
+            logger.info("Fetching emails...")
+            new_exposes = email_processor.fetch_emails()
+            logger.warning(f"Email fetching completed! Found {new_exposes} new exposes")
+            # One token per worker that has something to do
+            for _ in range(min(new_exposes, consumers)):
+                wake_queue.put(new_exposes)
+            # Sleep until the next cycle, or less if the mail server pushes a new alert (IMAP IDLE)
+            email_processor.wait_for_new_mail(random.uniform(60, 120), stop_event)
+    except Exception as e:
+        logger.error(f"Email fetcher stopped unexpectedly: {e}", exc_info=True)
+        stop_event.set()
+    finally:
+        email_processor.close()
+        email_processor.db.close()
+        logger.warning("Email fetcher stopped.")
+
+
 def main():
     init_log()
     logger.warning(">----------------------- Flatbot starting! -----------------------<")
@@ -37,38 +61,53 @@ def main():
     print("Initializing the database...")
     db_instance = ExposeDB()
     logger.info("Database initialized successfully!")
+    # Exposes are leased from the database queue, several workers and Flatbot processes can share flats.db
+    db_instance.release_expired_leases()
+    browser_workers = max(1, int(os.getenv("BROWSER_WORKERS", 1)))
+
+    # SIGINT/SIGTERM let the current expose finish, then everything shuts down cleanly
+    stop_event = threading.Event()
+
+    def request_stop(signum, frame):
+        if stop_event.is_set():
+            raise KeyboardInterrupt
+        logger.warning(f"Signal {signum} received, finishing current work before exiting (repeat to force)...")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    # With one worker the browser runs in this process on the configured profile,
+    # with more each worker gets its own process, profile copy and debugging port
+    pool = None
+    if browser_workers > 1:
+        pool = WorkerPool(browser_workers, log_initializer=init_log)
+        wake_queue = pool.wake_queue
+    else:
+        wake_queue = queue.Queue()
+
+    # The database is the queue of record, wake_queue only carries "new exposes" notifications
     email_processor = EmailFetcher(db_instance)
-    while True:
-        logger.info("Fetching emails...")
-        new_exposes = email_processor.fetch_emails()
-        logger.warning(f"Email fetching completed! Found {new_exposes} new exposes")
-        time.sleep(2)
-        logger.info("Starting processor...")
-        exposes = db_instance.get_unprocessed_exposes()
-        if  exposes:
-            stealth_chrome = StealthBrowser()
-            for expose in exposes:
-                try:
-                    processor_module = importlib.import_module(f"modules.{expose.source}_processor")
-                    processor_class = getattr(processor_module, f"{expose.source}_processor", None)
-                    if not processor_class:
-                        logger.error(f"Processor class for {expose.source} not found")
-                        continue
-                    processor_instance = processor_class(stealth_chrome)
-                    processor_instance.process_expose(expose)
-                    db_instance.update_expose(expose)
-                    StealthBrowser.random_wait()
-                except ModuleNotFoundError:
-                    logger.error(f"Processor module for {expose.source} not found")
-                except AttributeError as e:
-                    logger.error(f"Error accessing processor class: {e}")
-                except Exception as e:
-                    logger.error(f"Error processing expose from {expose.source}: {e}")
-            logger.warning("All new exposes processed.")
-            stealth_chrome.kill()
+    fetcher = threading.Thread(
+        target=fetch_emails_loop, args=(email_processor, wake_queue, browser_workers, stop_event), name="EmailFetcher"
+    )
+
+    try:
+        if pool:
+            pool.start()
+            fetcher.start()
+            pool.wait(stop_event)
         else:
-            logger.warning("No unprocessed exposes found.")
-        StealthBrowser.random_wait(60, 120)
+            fetcher.start()
+            ExposeWorker(db_instance, stop_event).run(wake_queue)
+    finally:
+        stop_event.set()
+        if pool:
+            pool.stop()
+        if fetcher.is_alive():
+            fetcher.join()
+        db_instance.close()
+        logger.warning(">----------------------- Flatbot stopped -----------------------<")
 
 ############################################################
 if __name__ == "__main__":
@@ -1,9 +1,16 @@
+import os
+import re
+import json
+import time
 import logging
+import requests
 from modules.Database import ExposeDB
 from modules.Expose import Expose
 from modules.ApplicationGenerator import ApplicationGenerator
 from dotenv import load_dotenv
 from modules.StealthBrowser import StealthBrowser
+from modules.HtmlScraper import HtmlScraper
+from modules.SessionStore import SessionStore
 from datetime import datetime
 from selenium.webdriver.support.ui import WebDriverWait
 
@@ -15,12 +22,44 @@ logger = logging.getLogger(__name__)
 class BaseExposeProcessor:
     name = "BaseProcessor"
     domain = "BaseDomain"
+    # Expose attribute -> CSS selector, scraped in one go by _extract_fields
+    scrape_fields = {}
+    # Data object embedded in the page source (regex with one group capturing a JSON object),
+    # and Expose attribute -> key in that object, used for fields the selectors did not find
+    embedded_json_pattern = None
+    embedded_json_fields = {}
+    # Site origin whose logged in session is stored and restored, None disables the session store
+    session_origin = None
+    # Ordered steps of process_expose, each implemented as _step_<name>(Expose) returning True when done.
+    # The default runs the _handle_page hook of processors that do not define their own steps
+    steps = ("navigate", "handle_page")
+    # Failed step -> step the next attempt resumes at (the failed step itself if missing)
+    resume_steps = {"handle_page": "navigate"}
+    # Steps that must never run twice for an expose (e.g. sending the application), see _committed_step
+    irreversible_steps = ()
+    # Failed step -> failure class (see RETRY_BACKOFF in Database), when the step did not set one
+    step_failure_classes = {"navigate": "page"}
+    # Entries kept in Expose.step_log
+    step_log_size = 50
+    # Page titles for the HTTP pre-flight check: {"expired": titles of dead listings, "gated": captcha/login walls}
+    preflight_titles = {}
     ApplicationGenerator = ApplicationGenerator()
 
     def __init__(self, email, password, stealthbrowser):
         self.email = email
         self.password = password
         self.stealth_chrome: StealthBrowser = stealthbrowser
+        # Why the last attempt failed (see RETRY_BACKOFF in Database), set by the steps
+        self.failure_class = None
+        # Processors are created for each new browser, load the last known session into it
+        self.session_store = SessionStore(self.name, self.domain, self.session_origin) if self.session_origin else None
+        self.session_restored = self._restore_session()
+        self.session_saved = self.session_restored
+        self.login_performed = False
+        # Called with the Expose after every step, to persist progress (set by the worker)
+        self.checkpoint = None
+        # Called with the Expose before scraping, fills in details stored meanwhile, returns True if any (set by the worker)
+        self.load_details = None
         
 
     def get_name(self):
@@ -40,34 +79,219 @@ class BaseExposeProcessor:
     def _generate_expose_link(Expose):
         raise NotImplementedError
     
-    #Returns updated Expose object
-    def _handle_page(self, Expose, StealthBrowser):
+    # Returns {field: text} for scrape_fields, "Unknown" for fields not found in the page
+    # SCRAPE_ENGINE=html (default) parses the page source outside the browser, browser queries the live DOM
+    def _extract_fields(self):
+        if os.getenv("SCRAPE_ENGINE", "html").lower() == "browser":
+            fields = self.stealth_chrome.extract_fields(self.scrape_fields)
+        else:
+            fields = self.parse_fields(self.stealth_chrome.page_source)
+        return {field: value if value else "Unknown" for field, value in fields.items()}
+
+    # Returns {field: text or None} for scrape_fields, parsed from a page source
+    @classmethod
+    def parse_fields(cls, page_source):
+        fields = HtmlScraper.extract_fields(page_source, cls.scrape_fields)
+        missing = [field for field, value in fields.items() if not value and field in cls.embedded_json_fields]
+        if missing and cls.embedded_json_pattern:
+            match = re.search(cls.embedded_json_pattern, page_source, re.DOTALL)
+            try:
+                data = json.loads(match.group(1)) if match else {}
+            except ValueError:
+                data = {}
+            for field in missing:
+                value = data.get(cls.embedded_json_fields[field])
+                if value not in (None, ""):
+                    fields[field] = str(value)
+        return fields
+
+    # Scrapes the expose over plain HTTP, returns the details for ExposeDB.update_expose_details,
+    # or None when the page could not be scraped this way (captcha wall, error...), the browser scrapes it then
+    @classmethod
+    def scrape_over_http(cls, Expose, http_session):
+        try:
+            response = http_session.get(cls._generate_expose_link(Expose))
+        except requests.RequestException as e:
+            logger.info(f"HTTP scrape of {Expose.expose_id} failed: {e}")
+            return None
+        if response.status_code != 200:
+            logger.info(f"HTTP scrape of {Expose.expose_id} got status {response.status_code}")
+            return None
+        fields = cls.parse_fields(response.text)
+        page_title = HtmlScraper.extract_fields(response.text, {"title": "title"})["title"] or ""
+        if any(title in page_title for title in cls.preflight_titles.get("gated", ())):
+            logger.info(f"HTTP scrape of {Expose.expose_id} hit a captcha/login wall, leaving it to the browser.")
+            return None
+        if not fields.get("title"):
+            logger.info(f"HTTP scrape of {Expose.expose_id} found no offer title.")
+            return None
+        details = {field: value if value else "Unknown" for field, value in fields.items()}
+        details["scraped_at"] = datetime.utcnow()
+        return details
+
+    # Loads the stored session into the browser, returns True if there was one
+    def _restore_session(self):
+        if not self.session_store:
+            return False
+        try:
+            return self.session_store.restore(self.stealth_chrome)
+        except Exception as e:
+            logger.warning(f"Could not restore session for {self.name}: {e}")
+            return False
+
+    def _save_session(self):
+        if not self.session_store:
+            return
+        try:
+            self.session_store.save(self.stealth_chrome)
+            self.session_saved = True
+        except Exception as e:
+            logger.warning(f"Could not save session for {self.name}: {e}")
+
+    # Classifies the expose page fetched over plain HTTP as live, expired, gated or unknown (request failed)
+    @classmethod
+    def preflight(cls, Expose, http_session):
+        try:
+            response = http_session.get(cls._generate_expose_link(Expose))
+        except requests.RequestException as e:
+            logger.info(f"Pre-flight request failed: {e}")
+            return "unknown"
+        if response.status_code in (404, 410):
+            return "expired"
+        # Bot protections answer with an error status and a challenge page
+        if response.status_code in (401, 403, 405, 429):
+            return "gated"
+        if response.status_code != 200:
+            return "unknown"
+        page_title = HtmlScraper.extract_fields(response.text, {"title": "title"})["title"] or ""
+        for outcome in ("expired", "gated"):
+            if any(title in page_title for title in cls.preflight_titles.get(outcome, ())):
+                return outcome
+        return "live"
+
+    #Updates the Expose, sets Expose.processed when done
+    def _handle_page(self, Expose):
         logger.error(self.name)
         raise NotImplementedError
 
-    #Returns updated Expose object
+    def _step_handle_page(self, Expose):
+        self._handle_page(Expose)
+        return Expose.processed == True
+
+    # Loads the expose page, common first step of all processors
+    def _step_navigate(self, Expose):
+        self.stealth_chrome.get(self._generate_expose_link(Expose))
+        # Explicit wait for the title to not be empty
+        WebDriverWait(self.stealth_chrome, 10).until(
+            lambda d: d.title.strip() != ""
+        )
+        return True
+
+    # Appends a step outcome to Expose.step_log and persists the progress
+    def _record_step(self, Expose, step, outcome, seconds, attempt):
+        try:
+            step_log = json.loads(Expose.step_log) if Expose.step_log else []
+        except ValueError:
+            step_log = []
+        step_log.append({
+            "step": step,
+            "outcome": outcome,
+            "seconds": round(seconds, 2),
+            "attempt": attempt,
+            "at": datetime.utcnow().isoformat(timespec="seconds"),
+        })
+        Expose.step_log = json.dumps(step_log[-self.step_log_size:])
+        if outcome == "ok":
+            Expose.last_step = step
+        logger.info(f"Step {step} {outcome} in {seconds:.1f}s")
+        if self.checkpoint:
+            try:
+                self.checkpoint(Expose)
+            except Exception as e:
+                logger.warning(f"Could not checkpoint expose {Expose.expose_id}: {e}")
+
+    # Returns the last irreversible step the expose completed (up to Expose.last_step), None if there is none
+    def _committed_step(self, Expose):
+        if Expose.last_step not in self.steps:
+            return None
+        completed = self.steps[:self.steps.index(Expose.last_step) + 1]
+        committed = [step for step in completed if step in self.irreversible_steps]
+        return committed[-1] if committed else None
+
+    # Ends the processing of an expose that can not be retried safely, it is left for the user to check
+    def _flag_for_review(self, Expose, committed_step, attempt):
+        logger.warning(
+            f"Expose {Expose.expose_id} already completed step {committed_step}, not repeating it. "
+            f"Marked as processed, please check it manually."
+        )
+        Expose.processed = True
+        self._record_step(Expose, committed_step, "needs review", 0, attempt)
+
+    # Picks up details stored since the expose was claimed (e.g. scraped over HTTP), so they are not scraped again
+    def _load_stored_details(self, Expose):
+        if not self.load_details:
+            return
+        try:
+            if self.load_details(Expose):
+                logger.info(f"Details of expose {Expose.expose_id} were stored meanwhile, not scraping again.")
+        except Exception as e:
+            logger.warning(f"Could not load stored details of expose {Expose.expose_id}: {e}")
+
+    #Runs the steps, retrying from the step that failed, updates the Expose
     def process_expose(self, Expose: Expose):
         logger.info(f"Processing expose: {Expose.expose_id}")
-        offer_link = self._generate_expose_link(Expose)
+        self.failure_class = None
         max_attempts = 4
-        for attempt in range(1, max_attempts + 1):
-            logger.info(f"Attempt {attempt}...")     
-            self.stealth_chrome.get(offer_link)
-            # Explicit wait for the title to not be empty
-            WebDriverWait(self.stealth_chrome, 10).until(
-                lambda d: d.title.strip() != ""
-            )
-            self._handle_page(Expose)
+        attempt = 1
+        step_index = 0
+        if Expose.last_step:
+            committed_step = self._committed_step(Expose)
+            if committed_step:
+                # Starting over would repeat it, and the page showing how it went is gone
+                self._flag_for_review(Expose, committed_step, attempt)
+                return
+            # The browser page of the earlier run is gone, so the steps start over,
+            # data of completed steps (e.g. scraping) is reused by the steps
+            logger.info(f"Expose {Expose.expose_id} was last at step {Expose.last_step}, starting over from {self.steps[0]}.")
+        logger.info(f"Attempt {attempt}...")
+        while True:
+            step = self.steps[step_index]
+            # Steps may set a more specific failure class (captcha, login...)
+            self.failure_class = None
+            start_time = time.monotonic()
+            try:
+                done = getattr(self, f"_step_{step}")(Expose)
+            except Exception:
+                self.failure_class = self.failure_class or self.step_failure_classes.get(step)
+                self._record_step(Expose, step, "error", time.monotonic() - start_time, attempt)
+                raise
+            if not done:
+                self.failure_class = self.failure_class or self.step_failure_classes.get(step)
+            self._record_step(Expose, step, "ok" if done else "failed", time.monotonic() - start_time, attempt)
 
             if Expose.processed == True:
                 logger.warning(f"Attempt {attempt} succeeded!")
                 return
-            else:
-                logger.info(f"Attempt {attempt} failed.")
-            if attempt < max_attempts:
-                logger.info("Retrying...\n")
-                StealthBrowser.random_wait(15,20)
-            else:
+            if done and step_index + 1 < len(self.steps):
+                step_index += 1
+                continue
+
+            logger.info(f"Attempt {attempt} failed at step {step}.")
+            if attempt >= max_attempts:
                 logger.warning(f"All attempts failed.")
-                Expose.failures += 1
+                committed_step = self._committed_step(Expose)
+                if committed_step:
+                    self._flag_for_review(Expose, committed_step, attempt)
+                else:
+                    Expose.failures += 1
                 return
+            attempt += 1
+            resume_step = self.resume_steps.get(step, step)
+            step_index = self.steps.index(resume_step)
+            logger.info(f"Retrying from step {resume_step}...\n")
+            logger.info(f"Attempt {attempt}...")
+            if step_index == 0:
+                StealthBrowser.random_wait(15,20)
+            else:
+                # Still on the page, no need to wait as long as for a reload
+                StealthBrowser.random_wait()
@@ -0,0 +1,63 @@
+import os
+import time
+import logging
+from dotenv import load_dotenv
+from modules.StealthBrowser import StealthBrowser
+
+logger = logging.getLogger(__name__)
+
+
+# Keeps one StealthBrowser warm across processing cycles.
+# The browser is health checked before each use, and relaunched when it died
+# or after BROWSER_MAX_PAGES pages / BROWSER_MAX_UPTIME seconds to bound Chrome memory growth.
+class BrowserSession:
+    def __init__(self, profile_dir=None, debugging_port=None):
+        load_dotenv()
+        self.profile_dir = profile_dir
+        self.debugging_port = debugging_port
+        self.max_pages = int(os.getenv("BROWSER_MAX_PAGES", 100))
+        self.max_uptime = int(os.getenv("BROWSER_MAX_UPTIME", 4 * 3600))
+        self.browser = None
+        self.launches = 0
+
+    def acquire(self):
+        """Return a healthy browser, launching or recycling it when needed."""
+        if self.browser:
+            reason = self._recycle_reason()
+            if reason:
+                logger.warning(f"Relaunching browser: {reason}")
+                self.close()
+        if not self.browser:
+            start_time = time.monotonic()
+            self.browser = StealthBrowser(self.profile_dir, self.debugging_port)
+            self.launches += 1
+            logger.info(f"Browser launched in {time.monotonic() - start_time:.1f}s (launch #{self.launches})")
+        return self.browser
+
+    def close(self):
+        if not self.browser:
+            return
+        try:
+            self.browser.kill()
+        except Exception as e:
+            # The browser may already be gone, we only need the driver process to be cleaned up
+            logger.warning(f"Error closing browser: {e}")
+        self.browser = None
+
+    def _recycle_reason(self):
+        if self.browser.pages_loaded >= self.max_pages:
+            return f"{self.browser.pages_loaded} pages loaded"
+        uptime = time.monotonic() - self.browser.started_at
+        if uptime >= self.max_uptime:
+            return f"up for {uptime / 60:.0f} minutes"
+        if not self.is_alive():
+            return "health check failed"
+        return None
+
+    def is_alive(self):
+        # Cheapest round trip through driver and renderer
+        try:
+            return self.browser.execute_script("return 1") == 1
+        except Exception as e:
+            logger.info(f"Browser health check failed: {e}")
+            return False
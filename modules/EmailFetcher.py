@@ -1,20 +1,32 @@
 import os
+import time
+import threading
+import itertools
+import select
+import ssl
 import imaplib
 import base64
+import quopri
 import re
 import importlib
 import logging
-from email import parser
-from email.message import EmailMessage
+from email import parser, policy
 
+import backoff
 from dotenv import load_dotenv
 
 from modules.Database import ExposeDB
-from modules.Expose import Expose
 from modules.BaseExposeProcessor import BaseExposeProcessor
 
 logger = logging.getLogger(__name__)
 
+# Errors after which the IMAP session is considered dead and has to be rebuilt
+CONNECTION_ERRORS = (imaplib.IMAP4.abort, OSError)
+
+
+class IdleRejectedError(imaplib.IMAP4.error):
+    pass
+
 
 class EmailFetcher:
     def __init__(self, db=None):
@@ -29,6 +41,27 @@ class EmailFetcher:
         self.imap_port = int(os.getenv("EMAIL_IMAP_PORT"))
         self.mark_read = os.getenv("EMAIL_MARK_READ", "False").lower() == "true"
         self.delete_from_server = os.getenv("EMAIL_DELETE", "False").lower() == "true"
+        # IMAP IDLE (push) settings, servers drop idling clients after 29 minutes (RFC 2177)
+        self.use_idle = os.getenv("EMAIL_IDLE", "True").lower() == "true"
+        self.idle_timeout = int(os.getenv("EMAIL_IDLE_TIMEOUT", 25 * 60))
+        self.idle_supported = None
+        # Cycles an unreadable email holds the UID checkpoint back, before it is skipped
+        self.max_fetch_attempts = int(os.getenv("EMAIL_MAX_FETCH_ATTEMPTS", 5))
+        # UID -> failed attempts to read the email
+        self.fetch_failures = {}
+        # Long-lived IMAP session, (re)built on demand by get_mailbox()
+        self.mailbox_folder = "INBOX"
+        self.mailbox_key = f"{self.email_user}@{self.imap_server}/{self.mailbox_folder}"
+        self.mailbox = None
+        self.selected = False
+        self.uidvalidity = None
+        self.capabilities = set()
+        self.connection_stats = {
+            "connects": 0,
+            "reconnects": 0,
+            "last_connect_seconds": None,
+            "total_connect_seconds": 0.0,
+        }
         # Load processors dynamically
         self.processors = self.load_processors()
 
@@ -57,109 +90,530 @@ class EmailFetcher:
                 logging.info("Imported " + module_name)
         return processors
 
-    def get_email_body(self, email_message: EmailMessage) -> str:
-        """Extract the body of the email in plain text."""
-        if email_message.is_multipart():
-            for part in email_message.walk():
-                content_type = part.get_content_type()
-                content_disposition = str(part.get("Content-Disposition"))
-                if content_type == "text/plain" and "attachment" not in content_disposition:
-                    return part.get_payload(decode=True).decode("utf-8", errors="ignore")
-        else:
-            return email_message.get_payload(decode=True).decode("utf-8", errors="ignore")
-        return ""
-
     def fetch_emails(self):
         """
-        Fetch unread emails via IMAP, parse them, and mark them as read.
+        Fetch the emails received since the last cycle via IMAP, parse them, and mark them as read.
+        New emails are found by UID against the checkpoint stored in the database, so the \\Seen
+        flag (which other mail clients may set) does not matter. The whole mailbox is rescanned
+        only when the server changes UIDVALIDITY.
         Returns the number of new exposes that were inserted into the database.
         """
         logging.info("Fetching emails via IMAP...")
         new_exposes = 0
 
         try:
-            # Connect to the IMAP server
-            logging.info(f"Connecting to IMAP {self.imap_server}:{self.imap_port} as {self.email_user}")
-            mailbox = imaplib.IMAP4_SSL(self.imap_server, self.imap_port)
-            mailbox.login(self.email_user, self.email_password)
+            # Reuse the open session (health-checked, reconnected if needed)
+            mailbox = self.get_mailbox()
 
-            # Select the INBOX (read/write mode)
-            mailbox.select("INBOX")
+            checkpoint = self.db.get_mailbox_checkpoint(self.mailbox_key)
+            last_uid = 0
+            if checkpoint is None:
+                # First sync: pick up unread emails as before, then follow UIDs from the current end
+                logging.info("No mailbox checkpoint found, looking for unread emails.")
+                criteria = "UNSEEN"
+                last_uid = self._get_highest_uid(mailbox)
+            elif checkpoint[0] != self.uidvalidity:
+                logging.warning(f"UIDVALIDITY changed ({checkpoint[0]} -> {self.uidvalidity}), rescanning the whole mailbox.")
+                criteria = "ALL"
+            else:
+                last_uid = checkpoint[1]
+                criteria = f"UID {last_uid + 1}:*"
 
-            # Search for unread emails (use "ALL" if you want everything)
-            status, message_ids = mailbox.search(None, "UNSEEN")
+            status, message_ids = mailbox.uid("SEARCH", None, criteria)
             if status != "OK":
                 logging.error("Could not search for emails.")
-                mailbox.close()
-                mailbox.logout()
                 return new_exposes
 
-            # message_ids[0] is a space-separated string of email IDs
-            messages = message_ids[0].split()
-            logging.info(f"Found {len(messages)} unread emails.")
+            # message_ids[0] is a space-separated string of email UIDs,
+            # "n:*" always matches the newest email, even when its UID is lower than n
+            messages = [uid for uid in message_ids[0].split() if checkpoint is None or int(uid) > last_uid]
+            logging.info(f"Found {len(messages)} new emails.")
+            if not messages:
+                self.db.set_mailbox_checkpoint(self.mailbox_key, self.uidvalidity, last_uid)
+                return new_exposes
 
-            # Process each email
-            for num in messages:
-                # Retrieve the entire message
-                status, data = mailbox.fetch(num, "(RFC822)")
-                if status != "OK":
-                    logging.warning(f"Failed to fetch email with ID {num}. Skipping...")
-                    continue
+            # 1) Sender, subject and structure of every new email in a single FETCH
+            headers = self._fetch_headers(mailbox, messages)
 
-                # The raw email content is in data[0][1]
-                raw_email = data[0][1]
-                try:
-                    email_str = raw_email.decode("utf-8")
-                except UnicodeDecodeError:
-                    # If there's a decoding error, fallback
-                    email_str = raw_email.decode("latin-1", errors="ignore")
+            # 2) Keep only emails some processor is interested in
+            candidates = {}
+            for uid, header in headers.items():
+                processor_class = self._match_processor(header["from"], header["subject"])
+                if processor_class:
+                    candidates[uid] = processor_class
+                else:
+                    logger.debug(f"Skipping email from {header['from']} | Subject: {header['subject']}")
+            logging.info(f"{len(candidates)} of {len(messages)} new emails match a processor.")
 
-                email_message = parser.Parser().parsestr(email_str)
-                subject = email_message["Subject"] or ""
-                sender = email_message["From"] or ""
+            # 3) Download only the text/plain part of the matches, one FETCH per part layout
+            bodies = self._fetch_text_parts(mailbox, {uid: headers[uid] for uid in candidates})
 
-                body = self.get_email_body(email_message)
+            # Process each matching email, flag changes are applied to the whole batch at the end
+            handled = []
+            found_exposes = []
+            # Emails that could not be read this time, retried next cycle
+            failed = [uid for uid in messages if uid not in headers]
+            for uid, processor_class in candidates.items():
+                subject = headers[uid]["subject"]
+                sender = headers[uid]["from"]
+                body = bodies.get(uid, "")
                 logger.info(f"Processing email from {sender} | Subject: {subject}")
 
+                if uid not in bodies and headers[uid]["text_part"]:
+                    logger.warning(f"Could not download the body of email '{subject}', retrying next cycle.")
+                    failed.append(uid)
+                    continue
                 if not body:
                     logger.warning(f"Email with subject '{subject}' has no readable body.")
-                else:
-                    # Iterate over processors
-                    for domain, processor_class in self.processors.items():
-                        if domain in sender:
-                            # We have a processor, Extract Expose IDs
-                            expose_ids = processor_class.extract_expose_link(subject, body)
-                            if expose_ids:
-                                # It is an offer, attempt to store exposes
-                                for expose_id in expose_ids:
-                                    if not self.db.expose_exists(expose_id):
-                                        new_expose = Expose(
-                                            expose_id=expose_id,
-                                            source=processor_class.name
-                                        )
-                                        self.db.insert_expose(new_expose)
-                                        new_exposes += 1
-                                        logging.info(
-                                            f"Inserted expose {expose_id} into database (source='{processor_class.name}')."
-                                        )
-                                    else:
-                                        logging.info(f"Expose {expose_id} already exists.")
-                                # Then mark the email as read (add the \\Seen flag)
-                                if self.mark_read:
-                                    mailbox.store(num, "+FLAGS", "\\Seen")
-                                # Or/and delete it
-                                if self.delete_from_server:
-                                    mailbox.store(num, "+FLAGS", "\\Deleted")
-                                    mailbox.expunge()
-                            break  # Found our processor; no need to check others
-
-
-            mailbox.close()
-            mailbox.logout()
+                    continue
+
+                # We have a processor, Extract Expose IDs
+                expose_ids = processor_class.extract_expose_link(subject, body)
+                if expose_ids:
+                    # It is an offer, queue its exposes for storage
+                    logging.info(f"Found exposes {expose_ids} (source='{processor_class.name}').")
+                    found_exposes.extend((expose_id, processor_class.name) for expose_id in expose_ids)
+                    handled.append(uid)
+
+            # Store all exposes of the cycle at once, known ones are skipped by the database
+            new_exposes = self.db.insert_new_exposes(found_exposes)
+
+            # Then mark the emails as read and/or delete them
+            self._flag_handled_emails(mailbox, handled)
 
+            # Everything up to the newest UID seen has been handled, unless an email before it could not be read:
+            # the checkpoint stops right before the first of those so it is fetched again
+            last_uid = max([last_uid] + [int(uid) for uid in messages])
+            failed = self._count_fetch_failures(messages, failed)
+            if failed:
+                last_uid = min(last_uid, min(int(uid) for uid in failed) - 1)
+            self.db.set_mailbox_checkpoint(self.mailbox_key, self.uidvalidity, last_uid)
+
+        except CONNECTION_ERRORS as e:
+            logging.error(f"IMAP connection lost: {str(e)}")
+            self._disconnect()
         except imaplib.IMAP4.error as e:
             logging.error(f"IMAP4 error: {str(e)}")
         except Exception as e:
             logging.error(f"Error: {str(e)}")
 
+        logger.info(f"IMAP session stats: {self.connection_stats}")
         return new_exposes
+
+    def _count_fetch_failures(self, messages, failed):
+        """
+        Count a failed attempt for each email that could not be read, forget the ones that were read.
+        Returns the failed emails still worth a retry, those that failed max_fetch_attempts times are skipped.
+        """
+        for uid in messages:
+            if uid not in failed:
+                self.fetch_failures.pop(uid, None)
+        retry = []
+        for uid in failed:
+            self.fetch_failures[uid] = self.fetch_failures.get(uid, 0) + 1
+            if self.fetch_failures[uid] >= self.max_fetch_attempts:
+                logger.warning(f"Email {uid.decode()} could not be read in {self.fetch_failures[uid]} attempts, skipping it.")
+                del self.fetch_failures[uid]
+            else:
+                retry.append(uid)
+        return retry
+
+    def _flag_handled_emails(self, mailbox, uids):
+        """
+        Mark the handled emails as read (\\Seen) and/or deleted with a single UID STORE,
+        then remove deleted ones with a single (UID) EXPUNGE. UIDs never change within a
+        session, so the expunge can not shift the messages we are working on.
+        """
+        flags = []
+        if self.mark_read:
+            flags.append("\\Seen")
+        if self.delete_from_server:
+            flags.append("\\Deleted")
+        if not uids or not flags:
+            return
+
+        uid_set = b",".join(uids)
+        status, _ = mailbox.uid("STORE", uid_set, "+FLAGS", f"({' '.join(flags)})")
+        if status != "OK":
+            logging.warning(f"Could not set flags {flags} on emails {uid_set}.")
+            return
+        logging.info(f"Flagged {len(uids)} emails with {' '.join(flags)}.")
+
+        if self.delete_from_server:
+            if "UIDPLUS" in self.capabilities:
+                # Only expunge our own messages, leave other clients' deletions alone
+                mailbox.uid("EXPUNGE", uid_set)
+            else:
+                mailbox.expunge()
+
+    def _match_processor(self, sender, subject):
+        """Return the processor class registered for the sender's domain, if the subject passes its filter."""
+        for domain, processor_class in self.processors.items():
+            if domain in sender:
+                subject_filter = getattr(processor_class, "subject_filter", None)
+                if subject_filter and not any(keyword.lower() in subject.lower() for keyword in subject_filter):
+                    return None
+                return processor_class
+        return None
+
+    ###############################
+    ######## IMAP FETCHING ########
+    ###############################
+
+    def _fetch_headers(self, mailbox, messages):
+        """
+        Fetch FROM/SUBJECT and the MIME structure of all given messages (UIDs) in one command.
+        Returns {uid: {"from", "subject", "text_part"}} where text_part describes
+        the body section (text/plain, or the text/html of a single part email) as (section, encoding, charset), or None.
+        """
+        status, data = mailbox.uid("FETCH", b",".join(messages), "(BODY.PEEK[HEADER.FIELDS (FROM SUBJECT)] BODYSTRUCTURE)")
+        if status != "OK":
+            raise imaplib.IMAP4.error("Could not fetch email headers.")
+
+        headers = {}
+        for uid, response in self._split_fetch_response(data).items():
+            raw_header = next(iter(response["literals"].values()), b"")
+            header = parser.BytesParser(policy=policy.default).parsebytes(raw_header, headersonly=True)
+            structure = self._extract_bodystructure(response["meta"])
+            headers[uid] = {
+                "from": str(header["From"] or ""),
+                "subject": str(header["Subject"] or ""),
+                "text_part": self._find_text_part(structure) if structure else None,
+            }
+        return headers
+
+    def _fetch_text_parts(self, mailbox, headers):
+        """
+        Fetch and decode the text/plain part of the given messages with BODY.PEEK,
+        which leaves the \\Seen flag alone. Messages sharing the same part number are
+        fetched together, so a batch of alerts usually costs a single round trip.
+        Returns {uid: body}.
+        """
+        by_section = {}
+        for uid, header in headers.items():
+            if header["text_part"]:
+                by_section.setdefault(header["text_part"][0], []).append(uid)
+
+        bodies = {}
+        for section, uids in by_section.items():
+            status, data = mailbox.uid("FETCH", b",".join(uids), f"(BODY.PEEK[{section}])")
+            if status != "OK":
+                logging.warning(f"Failed to fetch body part {section} of emails {uids}. Skipping...")
+                continue
+            for uid, response in self._split_fetch_response(data).items():
+                if uid not in headers or section not in response["literals"]:
+                    continue
+                _, encoding, charset = headers[uid]["text_part"]
+                bodies[uid] = self._decode_part(response["literals"][section], encoding, charset)
+        return bodies
+
+    @staticmethod
+    def _split_fetch_response(data):
+        """
+        Group imaplib UID FETCH output by message.
+        Returns {uid: {"meta": bytes, "literals": {section: bytes}}}, where meta
+        holds all non-literal response text (UID, BODYSTRUCTURE...).
+        """
+        responses = []
+        current = None
+        for item in data:
+            text = item[0] if isinstance(item, tuple) else item
+            if not text:
+                continue
+            if re.match(rb"^\d+ \(", text):
+                current = {"meta": b"", "literals": {}}
+                responses.append(current)
+            if current is None:
+                continue
+            current["meta"] += text
+            # Small sections may come as quoted string (or NIL) instead of a literal
+            for section in re.finditer(rb'BODY\[([^\]]*)\](?:<\d+>)? ("(?:[^"\\]|\\.)*"|NIL)', text):
+                value = section.group(2)
+                literal = b"" if value == b"NIL" else re.sub(rb"\\(.)", rb"\1", value[1:-1])
+                current["literals"][section.group(1).decode()] = literal
+            if isinstance(item, tuple):
+                section = re.search(rb"BODY\[([^\]]*)\](?:<\d+>)? \{\d+\}$", text)
+                key = section.group(1).decode() if section else str(len(current["literals"]))
+                current["literals"][key] = item[1]
+
+        # The UID item can come before or after the literals, look it up once the response is complete
+        by_uid = {}
+        for response in responses:
+            uid = re.search(rb"UID (\d+)", response["meta"])
+            if uid:
+                by_uid[uid.group(1)] = response
+        return by_uid
+
+    @staticmethod
+    def _extract_bodystructure(meta):
+        position = meta.find(b"BODYSTRUCTURE ")
+        if position < 0:
+            return None
+        structure, _ = EmailFetcher._parse_sexp(meta, position + len(b"BODYSTRUCTURE "))
+        return structure
+
+    @staticmethod
+    def _parse_sexp(data, position):
+        """Parse one IMAP parenthesized list/atom starting at position. Returns (value, next_position)."""
+        while data[position:position + 1] == b" ":
+            position += 1
+        char = data[position:position + 1]
+        if char == b"(":
+            items = []
+            position += 1
+            while True:
+                while data[position:position + 1] == b" ":
+                    position += 1
+                if data[position:position + 1] in (b")", b""):
+                    return items, position + 1
+                item, position = EmailFetcher._parse_sexp(data, position)
+                items.append(item)
+        if char == b'"':
+            value = bytearray()
+            position += 1
+            while position < len(data) and data[position:position + 1] != b'"':
+                if data[position:position + 1] == b"\\":
+                    position += 1
+                value += data[position:position + 1]
+                position += 1
+            return value.decode(errors="ignore"), position + 1
+        atom = re.match(rb"[^ ()]*", data[position:]).group(0)
+        value = atom.decode(errors="ignore")
+        return (None if value.upper() == "NIL" else value), position + len(atom)
+
+    @staticmethod
+    def _find_text_part(structure, section=""):
+        """
+        Walk a parsed BODYSTRUCTURE and return (section, encoding, charset) of the first inline text/plain part.
+        A single part email is its own body part "1", it is used when it is text/plain or text/html.
+        """
+        if structure and isinstance(structure[0], list):
+            # Multipart: child parts first, then the subtype
+            parts = itertools.takewhile(lambda part: isinstance(part, list), structure)
+            for index, part in enumerate(parts):
+                found = EmailFetcher._find_text_part(part, f"{section}.{index + 1}" if section else str(index + 1))
+                if found:
+                    return found
+            return None
+        if len(structure) < 7 or not isinstance(structure[0], str):
+            return None
+        subtypes = ("plain",) if section else ("plain", "html")
+        if structure[0].lower() != "text" or str(structure[1]).lower() not in subtypes:
+            return None
+        # text parts: type, subtype, params, id, description, encoding, size, lines, md5, disposition...
+        disposition = structure[9] if len(structure) > 9 else None
+        if isinstance(disposition, list) and disposition and str(disposition[0]).lower() == "attachment":
+            return None
+        params = structure[2] if isinstance(structure[2], list) else []
+        charset = "utf-8"
+        for key, value in zip(params[::2], params[1::2]):
+            if str(key).lower() == "charset" and value:
+                charset = value
+        return (section or "1", str(structure[5] or "7bit").lower(), charset)
+
+    @staticmethod
+    def _decode_part(payload, encoding, charset):
+        if encoding == "base64":
+            payload = base64.b64decode(payload)
+        elif encoding == "quoted-printable":
+            payload = quopri.decodestring(payload)
+        try:
+            return payload.decode(charset, errors="ignore")
+        except LookupError:
+            # Unknown charset, fallback
+            return payload.decode("latin-1", errors="ignore")
+
+    ###############################
+    ######## IMAP SESSION #########
+    ###############################
+
+    def get_mailbox(self):
+        """
+        Return the long-lived IMAP session with the INBOX selected.
+        The session is checked with a NOOP, rebuilt if the server dropped it,
+        and the folder is selected again only after a reconnect.
+        """
+        if self.mailbox is not None:
+            try:
+                status, _ = self.mailbox.noop()
+                if status != "OK":
+                    raise imaplib.IMAP4.abort(f"NOOP returned {status}")
+            except CONNECTION_ERRORS as e:
+                logger.warning(f"IMAP session unhealthy ({e}), reconnecting...")
+                self._disconnect()
+                self.connection_stats["reconnects"] += 1
+
+        if self.mailbox is None:
+            self._connect()
+
+        if not self.selected:
+            status, _ = self.mailbox.select(self.mailbox_folder)
+            if status != "OK":
+                raise imaplib.IMAP4.error(f"Could not select {self.mailbox_folder}")
+            _, uidvalidity = self.mailbox.response("UIDVALIDITY")
+            self.uidvalidity = int(uidvalidity[0]) if uidvalidity and uidvalidity[0] else 0
+            self.selected = True
+        return self.mailbox
+
+    @staticmethod
+    def _get_highest_uid(mailbox):
+        status, data = mailbox.uid("SEARCH", None, "UID *")
+        uids = data[0].split() if status == "OK" and data and data[0] else []
+        return max((int(uid) for uid in uids), default=0)
+
+    @backoff.on_exception(backoff.expo, CONNECTION_ERRORS, max_tries=5, max_value=60)
+    def _connect(self):
+        logging.info(f"Connecting to IMAP {self.imap_server}:{self.imap_port} as {self.email_user}")
+        start = time.monotonic()
+        mailbox = imaplib.IMAP4_SSL(self.imap_server, self.imap_port)
+        try:
+            mailbox.login(self.email_user, self.email_password)
+            # Capabilities may change after authentication, ask again
+            status, data = mailbox.capability()
+        except Exception:
+            mailbox.shutdown()
+            raise
+        capabilities = data[0].decode().upper().split() if status == "OK" and data and data[0] else []
+        self.capabilities = set(capabilities)
+        self.idle_supported = "IDLE" in capabilities
+        elapsed = time.monotonic() - start
+
+        self.mailbox = mailbox
+        self.selected = False
+        self.connection_stats["connects"] += 1
+        self.connection_stats["last_connect_seconds"] = elapsed
+        self.connection_stats["total_connect_seconds"] += elapsed
+        logger.info(f"IMAP session established in {elapsed:.3f} seconds.")
+
+    def _disconnect(self):
+        if self.mailbox is not None:
+            try:
+                self.mailbox.logout()
+            except Exception:
+                pass
+        self.mailbox = None
+        self.selected = False
+
+    def close(self):
+        """Expunge pending deletions and log out, call on shutdown."""
+        if self.mailbox is not None and self.selected:
+            try:
+                self.mailbox.close()
+            except Exception:
+                pass
+        self._disconnect()
+
+    ###############################
+    ####### IMAP IDLE (PUSH) ######
+    ###############################
+
+    def wait_for_new_mail(self, max_wait, stop_event=None):
+        """
+        Block until the server announces new mail (EXISTS/RECENT) or max_wait seconds pass.
+        Uses IMAP IDLE on the long-lived session; the IDLE command is renewed every
+        idle_timeout seconds so the server never drops us. Falls back to a plain sleep when
+        IDLE is disabled or not supported by the server.
+        Setting stop_event (threading.Event) ends the wait early.
+        Returns True if new mail was announced.
+        """
+        stop_event = stop_event or threading.Event()
+        deadline = time.monotonic() + max_wait
+        while self.use_idle and self.idle_supported is not False:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or stop_event.is_set():
+                return False
+            try:
+                mailbox = self.get_mailbox()
+                if not self.idle_supported:
+                    logger.warning("IMAP server does not support IDLE, falling back to polling.")
+                    break
+                if self._idle(mailbox, min(remaining, self.idle_timeout), stop_event):
+                    logger.info("IMAP IDLE: new mail announced by the server.")
+                    return True
+            except CONNECTION_ERRORS as e:
+                # Connection dropped (server timeout, network hiccup...), reconnect on next round
+                logger.warning(f"IMAP IDLE session lost: {e}, reconnecting...")
+                self._disconnect()
+                self.connection_stats["reconnects"] += 1
+                stop_event.wait(min(5, max(deadline - time.monotonic(), 0)))
+            except IdleRejectedError as e:
+                logger.error(f"IMAP IDLE error: {e}, falling back to polling.")
+                self.idle_supported = False
+            except imaplib.IMAP4.error as e:
+                # Server said NO/BAD to something else (LOGIN, SELECT...), may be temporary: start a new session
+                logger.warning(f"IMAP error while waiting for mail: {e}, reconnecting...")
+                self._disconnect()
+                self.connection_stats["reconnects"] += 1
+                stop_event.wait(min(30, max(deadline - time.monotonic(), 0)))
+
+        remaining = deadline - time.monotonic()
+        if remaining > 0:
+            logger.info(f"Polling mode, waiting for {remaining:.2f} seconds...")
+            stop_event.wait(remaining)
+        return False
+
+    def _idle(self, mailbox, timeout, stop_event=None):
+        # imaplib has no IDLE support (before python 3.14), talk to the server directly
+        tag = mailbox._new_tag()
+        mailbox.send(tag + b" IDLE\r\n")
+        response = mailbox.readline()
+        while response.startswith(b"* "):
+            # Untagged data queued before IDLE started
+            if self._is_new_mail_response(response):
+                timeout = 0
+            response = mailbox.readline()
+        if not response.startswith(b"+"):
+            mailbox.tagged_commands.pop(tag, None)
+            raise IdleRejectedError(f"IDLE rejected: {response.decode(errors='ignore').strip()}")
+        logger.debug(f"IMAP IDLE started, waiting up to {timeout:.0f} seconds.")
+
+        new_mail = timeout == 0
+        deadline = time.monotonic() + timeout
+        while not new_mail:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (stop_event and stop_event.is_set()):
+                break
+            if not self._has_buffered_data(mailbox):
+                # Wake up every second to notice a shutdown request
+                readable, _, _ = select.select([mailbox.sock], [], [], min(remaining, 1))
+                if not readable:
+                    continue
+            line = mailbox.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("Connection closed by server during IDLE.")
+            if line.startswith(b"* BYE"):
+                raise imaplib.IMAP4.abort(line.decode(errors="ignore").strip())
+            new_mail = self._is_new_mail_response(line)
+
+        # Terminate IDLE and consume everything up to the tagged completion
+        mailbox.send(b"DONE\r\n")
+        while True:
+            line = mailbox.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("Connection closed by server while ending IDLE.")
+            if line.startswith(tag):
+                break
+            new_mail = new_mail or self._is_new_mail_response(line)
+        mailbox.tagged_commands.pop(tag, None)
+        return new_mail
+
+    @staticmethod
+    def _has_buffered_data(mailbox):
+        """
+        True if data already waits in imaplib's read buffer or the SSL layer, where select() can not see it
+        (e.g. "* 5 EXISTS" sent in the same packet as the IDLE continuation).
+        """
+        timeout = mailbox.sock.gettimeout()
+        # peek() only reads from the socket when the buffer is empty, non-blocking it never waits for the server
+        mailbox.sock.setblocking(False)
+        try:
+            return bool(mailbox.file.peek(1))
+        except (BlockingIOError, ssl.SSLWantReadError):
+            return False
+        finally:
+            mailbox.sock.settimeout(timeout)
+
+    @staticmethod
+    def _is_new_mail_response(line):
+        # e.g. b"* 23 EXISTS" or b"* 1 RECENT"
+        return bool(re.match(rb"^\* \d+ (EXISTS|RECENT)", line.strip(), re.IGNORECASE))
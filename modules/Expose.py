@@ -5,7 +5,8 @@ class Expose:
     def __init__(self, expose_id, source=None, title=None, price_kalt=None, price_warm=None, nebekosten=None, 
                  location=None, square_meters=None, number_of_rooms=None, agent_name=None, 
                  real_estate_agency=None, energetic_rating=None, construction_year=None, description=None, 
-                 neighborhood=None, processed=0, failures=0, received_at=None, scraped_at=None, applied_at = None):
+                 neighborhood=None, processed=0, failures=0, received_at=None, scraped_at=None, applied_at = None,
+                 last_step=None, step_log=None):
         self.expose_id = expose_id
         self.source = source
         self.title = title
@@ -26,6 +27,9 @@ class Expose:
         self.received_at = received_at or datetime.utcnow()
         self.scraped_at = scraped_at
         self.applied_at = applied_at
+        # Last completed processing step and JSON log of step outcomes (see BaseExposeProcessor.process_expose)
+        self.last_step = last_step
+        self.step_log = step_log
 
     def update_field(self, field_name, value):
         if hasattr(self, field_name):
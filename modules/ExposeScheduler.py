@@ -0,0 +1,74 @@
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+# Decides which waiting expose a worker processes next.
+# The first applicants get the flats, so fresh alerts preempt retries of old exposes,
+# while retries gain priority the longer they wait so they are never starved.
+class ExposeScheduler:
+    # Bonus of a brand new alert, halved every FRESH_HALF_LIFE_MINUTES
+    FRESH_BONUS = 100.0
+    FRESH_HALF_LIFE_MINUTES = 10.0
+    # Malus per failed attempt
+    RETRY_PENALTY = 10.0
+    # Priority gained per minute spent waiting in the queue
+    AGING_PER_MINUTE = 1.0
+    # Extra priority per source (processor name)
+    SOURCE_WEIGHTS = {
+        "Immobilienscout24": 0.0,
+    }
+
+    def __init__(self):
+        self.dispatched = []
+
+    def score(self, expose, waiting_since, now):
+        age_minutes = self._minutes_between(expose.received_at, now)
+        wait_minutes = self._minutes_between(waiting_since, now)
+        freshness = self.FRESH_BONUS * 0.5 ** (age_minutes / self.FRESH_HALF_LIFE_MINUTES)
+        return (
+            freshness
+            - self.RETRY_PENALTY * (expose.failures or 0)
+            + self.AGING_PER_MINUTE * wait_minutes
+            + self.SOURCE_WEIGHTS.get(expose.source, 0.0)
+        )
+
+    def pick(self, candidates, now=None):
+        """
+        Choose the expose to dispatch among candidates, a list of (Expose, waiting_since).
+        The choice is recorded for the run summary.
+        """
+        now = now or datetime.utcnow()
+        ranked = sorted(candidates, key=lambda candidate: self.score(candidate[0], candidate[1], now), reverse=True)
+        expose, waiting_since = ranked[0]
+        score = self.score(expose, waiting_since, now)
+        wait_seconds = self._minutes_between(waiting_since, now) * 60
+        self.dispatched.append((expose.expose_id, score, wait_seconds))
+        logger.info(
+            f"Dispatching expose {expose.expose_id} (score {score:.1f}, waited {wait_seconds:.0f}s, "
+            f"{expose.failures} failures) out of {len(candidates)} waiting."
+        )
+        return expose
+
+    def start_run(self):
+        self.dispatched = []
+
+    def log_run_summary(self):
+        if not self.dispatched:
+            return
+        waits = [wait for _, _, wait in self.dispatched]
+        order = ", ".join(f"{expose_id} ({wait:.0f}s)" for expose_id, _, wait in self.dispatched)
+        logger.warning(
+            f"Dispatched {len(self.dispatched)} exposes, queue wait avg {sum(waits) / len(waits):.0f}s "
+            f"max {max(waits):.0f}s. Order: {order}"
+        )
+
+    @staticmethod
+    def _minutes_between(start, end):
+        # Timestamps read back from sqlite are strings
+        if isinstance(start, str):
+            start = datetime.fromisoformat(start)
+        if start is None:
+            return 0.0
+        return max((end - start).total_seconds() / 60, 0.0)
@@ -0,0 +1,201 @@
+import os
+import time
+import queue
+import random
+import threading
+import socket
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+import logging
+from modules.StealthBrowser import StealthBrowser
+from modules.BrowserSession import BrowserSession
+from modules.Pacing import pacer
+from modules.HttpSession import HttpSession
+from modules.SessionStore import SessionStore
+from modules.ExposeScheduler import ExposeScheduler
+
+logger = logging.getLogger(__name__)
+
+
+# Claims exposes from the database queue and processes them with its own browser.
+# Runs in the main process, or one per process in a WorkerPool.
+class ExposeWorker:
+    def __init__(self, db, stop_event, worker_id=None, lease_seconds=None, profile_dir=None, debugging_port=None):
+        self.db = db
+        self.stop_event = stop_event
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_seconds = lease_seconds or int(os.getenv("EXPOSE_LEASE_SECONDS", 900))
+        # Stays open between cycles, None means the browser defaults from .env
+        self.browser_session = BrowserSession(profile_dir, debugging_port)
+        # Fresh alerts first, retries when nothing newer is waiting
+        self.scheduler = ExposeScheduler()
+        # Check over plain HTTP if a listing is still online before opening it in the browser
+        self.preflight = os.getenv("PREFLIGHT", "True").lower() == "true"
+        # source -> HttpSession with the cookies of that site
+        self.http_sessions = {}
+        # Scrape waiting exposes over HTTP, concurrently, so the browser is only needed to apply
+        self.http_scrape = os.getenv("HTTP_SCRAPE", "False").lower() == "true"
+        self.http_scrape_workers = int(os.getenv("HTTP_SCRAPE_WORKERS", 4))
+        self.scrape_executor = None
+        # Expose IDs queued or being scraped over HTTP
+        self.prefetching = set()
+        self.prefetching_lock = threading.Lock()
+
+    def run(self, wake_queue):
+        """Process waiting exposes, then sleep until woken up by wake_queue or retries may be due."""
+        logger.warning(f"Worker {self.worker_id} started.")
+        try:
+            while not self.stop_event.is_set():
+                logger.info("Starting processor...")
+                self.process_waiting()
+                # Wake up as soon as the fetcher stores new exposes, or when retries may be due
+                deadline = time.monotonic() + random.uniform(60, 120)
+                while not self.stop_event.is_set() and time.monotonic() < deadline:
+                    try:
+                        new_exposes = wake_queue.get(timeout=1)
+                    except queue.Empty:
+                        continue
+                    logger.info(f"Worker {self.worker_id} woken up by {new_exposes} new exposes.")
+                    break
+        finally:
+            self.browser_session.close()
+            if self.scrape_executor:
+                self.scrape_executor.shutdown(wait=True, cancel_futures=True)
+            for http_session in self.http_sessions.values():
+                http_session.close()
+        logger.warning(f"Worker {self.worker_id} stopped.")
+
+    def process_waiting(self):
+        """Claim and process waiting exposes until the queue is empty or we are asked to stop."""
+        # Each expose gets one run per cycle, failed ones wait for the next cycle
+        attempted = set()
+        self.scheduler.start_run()
+        expose = self.db.claim_next(self.worker_id, self.lease_seconds, scheduler=self.scheduler)
+        if not expose:
+            logger.warning("No unprocessed exposes found.")
+            return
+        # One processor instance per source, bound to the current browser
+        processors = {}
+        processors_browser = None
+        while expose:
+            attempted.add(expose.expose_id)
+            if self.http_scrape:
+                # Only after the claim: the leased expose is left to the browser, the ones behind it are scraped meanwhile
+                self.prefetch_details()
+            try:
+                processor_class = self._processor_class(expose.source)
+                if not processor_class:
+                    logger.error(f"Processor class for {expose.source} not found")
+                    self.db.fail_expose(expose.expose_id, self.worker_id)
+                elif self._preflight_dead(processor_class, expose):
+                    # Dead listing, no need to start or use the browser
+                    self.db.complete_expose(expose, self.worker_id)
+                else:
+                    stealth_chrome = self.browser_session.acquire()
+                    if stealth_chrome is not processors_browser:
+                        processors = {}
+                        processors_browser = stealth_chrome
+                    if expose.source not in processors:
+                        processors[expose.source] = processor_class(stealth_chrome)
+                        # Progress of each step is stored, a crashed run resumes with what was done
+                        processors[expose.source].checkpoint = self._checkpoint
+                        # Details scraped over HTTP after the claim are picked up before scraping
+                        processors[expose.source].load_details = self.db.load_expose_details
+                    processor_instance = processors[expose.source]
+                    pacer.start_expose(expose.expose_id)
+                    try:
+                        with self.db.keep_lease(expose.expose_id, self.worker_id, self.lease_seconds):
+                            processor_instance.process_expose(expose)
+                    finally:
+                        pacer.finish_expose()
+                    self.db.complete_expose(expose, self.worker_id, processor_instance.failure_class)
+                    StealthBrowser.random_wait()
+            except ModuleNotFoundError:
+                logger.error(f"Processor module for {expose.source} not found")
+                self.db.fail_expose(expose.expose_id, self.worker_id)
+            except AttributeError as e:
+                logger.error(f"Error accessing processor class: {e}")
+                self.db.fail_expose(expose.expose_id, self.worker_id)
+            except Exception as e:
+                logger.error(f"Error processing expose from {expose.source}: {e}")
+                self.db.fail_expose(expose.expose_id, self.worker_id)
+            if self.stop_event.is_set():
+                logger.warning("Shutdown requested, not claiming further exposes.")
+                break
+            expose = self.db.claim_next(self.worker_id, self.lease_seconds, exclude=attempted, scheduler=self.scheduler)
+        self.scheduler.log_run_summary()
+        logger.warning("All new exposes processed.")
+
+    def _checkpoint(self, expose):
+        self.db.checkpoint_expose(expose, self.worker_id)
+
+    def _http_session(self, processor_class):
+        if processor_class.name not in self.http_sessions:
+            session_store = None
+            if processor_class.session_origin:
+                session_store = SessionStore(processor_class.name, processor_class.domain, processor_class.session_origin)
+            self.http_sessions[processor_class.name] = HttpSession(session_store)
+        return self.http_sessions[processor_class.name]
+
+    def _preflight_dead(self, processor_class, expose):
+        """Mark expose processed and return True if the pre-flight check found the listing offline."""
+        if not self.preflight or not processor_class.preflight_titles:
+            return False
+        outcome = processor_class.preflight(expose, self._http_session(processor_class))
+        logger.info(f"Pre-flight of expose {expose.expose_id}: {outcome}")
+        if outcome != "expired":
+            return False
+        logger.warning(f"Expose {expose.expose_id} is offline, marked as processed without opening the browser.")
+        expose.processed = True
+        expose.last_step = "preflight"
+        return True
+
+    def prefetch_details(self):
+        """
+        Start scraping waiting exposes over HTTP in background threads, while the browser works.
+        Exposes this fails for (captcha wall...) are scraped by the browser as before.
+        Called after each claim, leased exposes are not in the queue, so the one the browser works on is skipped.
+        """
+        exposes = self.db.get_unscraped_exposes(limit=self.http_scrape_workers * 5)
+        # Resolved here, the scrape threads only share the (thread safe) HTTP sessions and the database
+        jobs = []
+        for expose in exposes:
+            with self.prefetching_lock:
+                if expose.expose_id in self.prefetching:
+                    continue
+            try:
+                processor_class = self._processor_class(expose.source)
+            except (ModuleNotFoundError, AttributeError) as e:
+                logger.debug(f"No HTTP scraping for {expose.source}: {e}")
+                continue
+            if processor_class and processor_class.scrape_fields:
+                jobs.append((expose, processor_class, self._http_session(processor_class)))
+        if not jobs:
+            return
+        if not self.scrape_executor:
+            self.scrape_executor = ThreadPoolExecutor(self.http_scrape_workers, thread_name_prefix="HttpScraper")
+        logger.info(f"Scraping {len(jobs)} exposes over HTTP in the background.")
+        for expose, processor_class, http_session in jobs:
+            with self.prefetching_lock:
+                self.prefetching.add(expose.expose_id)
+            self.scrape_executor.submit(self._scrape_over_http, expose, processor_class, http_session)
+
+    def _scrape_over_http(self, expose, processor_class, http_session):
+        start_time = time.monotonic()
+        try:
+            details = processor_class.scrape_over_http(expose, http_session)
+            if details and self.db.update_expose_details(expose.expose_id, details):
+                logger.info(f"Expose {expose.expose_id} scraped over HTTP in {time.monotonic() - start_time:.1f}s.")
+                return True
+            return False
+        except Exception as e:
+            logger.warning(f"HTTP scrape of {expose.expose_id} failed: {e}")
+            return False
+        finally:
+            with self.prefetching_lock:
+                self.prefetching.discard(expose.expose_id)
+
+    @staticmethod
+    def _processor_class(source):
+        processor_module = importlib.import_module(f"modules.{source}_processor")
+        return getattr(processor_module, f"{source}_processor", None)
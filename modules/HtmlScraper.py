@@ -0,0 +1,183 @@
+import re
+import logging
+from html.parser import HTMLParser
+
+logger = logging.getLogger(__name__)
+
+
+# Extracts texts from saved or captured page sources without a browser.
+# Understands the simple CSS selectors used in the processors' scrape_fields:
+# "tag", "#id", ".class", "tag.class", "tag[attr='value']" and combinations like "p.a.b[x='y']".
+# Like StealthBrowser.extract_fields, the first matching element wins and misses are None.
+class HtmlScraper(HTMLParser):
+    VOID_TAGS = {
+        "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr",
+    }
+    # Tags starting a new line in the rendered text (innerText)
+    BLOCK_TAGS = {
+        "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt", "fieldset", "figcaption",
+        "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "main", "nav",
+        "ol", "p", "pre", "section", "table", "tr", "ul",
+    }
+    SKIP_TAGS = {"script", "style", "noscript", "template"}
+    # Optional end tags, closed by the start of a sibling like the HTML parsing rules do:
+    # start tag -> (open tags it closes, open tags the search for them stops at)
+    IMPLIED_END_TAGS = {
+        "li": ({"li"}, {"ul", "ol", "table"}),
+        "dt": ({"dt", "dd"}, {"dl", "table"}),
+        "dd": ({"dt", "dd"}, {"dl", "table"}),
+        "tr": ({"tr", "td", "th"}, {"table"}),
+        "td": ({"td", "th"}, {"tr", "table"}),
+        "th": ({"td", "th"}, {"tr", "table"}),
+        "option": ({"option"}, {"select"}),
+    }
+    # Block start tags close an open <p>, unless it is outside the enclosing table cell/button
+    P_SCOPE_BOUNDARIES = {"table", "td", "th", "button", "object"}
+    SELECTOR_PATTERN = re.compile(
+        r"^(?P<tag>[a-zA-Z][\w-]*)?"
+        r"(?P<parts>(?:[#.][\w-]+|\[[\w-]+(?:=(?:'[^']*'|\"[^\"]*\"|[^\]]*))?\])*)$"
+    )
+    PART_PATTERN = re.compile(r"([#.])([\w-]+)|\[([\w-]+)(?:=('[^']*'|\"[^\"]*\"|[^\]]*))?\]")
+    # Compiled selectors are shared between instances
+    _selector_cache = {}
+
+    def __init__(self, field_map):
+        super().__init__(convert_charrefs=True)
+        self.selectors = {field: self.compile_selector(selector) for field, selector in field_map.items()}
+        self.results = {field: None for field in field_map}
+        # Open elements as (tag, fields captured by this element)
+        self.stack = []
+        # field -> list of text chunks, for elements currently being captured
+        self.capturing = {}
+        self.skip_depth = 0
+
+    @classmethod
+    def extract_fields(cls, html, field_map):
+        """Return {field: text} for the first element matching each selector, None if nothing matched."""
+        scraper = cls(field_map)
+        scraper.feed(html)
+        scraper.close()
+        return scraper.results
+
+    @classmethod
+    def compile_selector(cls, selector):
+        """Turn a selector into (tag, id, classes, attributes), raise ValueError if it is not supported."""
+        if selector in cls._selector_cache:
+            return cls._selector_cache[selector]
+        match = cls.SELECTOR_PATTERN.match(selector.strip())
+        if not match or not selector.strip():
+            raise ValueError(f"Unsupported selector: {selector}")
+        tag = match.group("tag").lower() if match.group("tag") else None
+        element_id = None
+        classes = set()
+        attributes = {}
+        for prefix, name, attribute, value in cls.PART_PATTERN.findall(match.group("parts")):
+            if prefix == "#":
+                element_id = name
+            elif prefix == ".":
+                classes.add(name)
+            else:
+                attributes[attribute.lower()] = value.strip("'\"") if value else None
+        compiled = (tag, element_id, frozenset(classes), attributes)
+        cls._selector_cache[selector] = compiled
+        return compiled
+
+    @staticmethod
+    def _matches(selector, tag, attrs):
+        selector_tag, element_id, classes, attributes = selector
+        if selector_tag and selector_tag != tag:
+            return False
+        if element_id and attrs.get("id") != element_id:
+            return False
+        if classes and not classes.issubset((attrs.get("class") or "").split()):
+            return False
+        for name, value in attributes.items():
+            if name not in attrs or (value is not None and attrs[name] != value):
+                return False
+        return True
+
+    def handle_starttag(self, tag, attrs):
+        if self.skip_depth:
+            if tag in self.SKIP_TAGS:
+                self.skip_depth += 1
+            return
+        if tag in self.SKIP_TAGS:
+            self.skip_depth = 1
+            return
+        self._close_implied(tag)
+        if tag in self.BLOCK_TAGS:
+            self._add_text("\n")
+        attrs = {name: value or "" for name, value in attrs}
+        started = []
+        for field, selector in self.selectors.items():
+            if self.results[field] is None and field not in self.capturing and self._matches(selector, tag, attrs):
+                if tag in self.VOID_TAGS:
+                    # Found, but there is no text in it
+                    self.results[field] = ""
+                else:
+                    self.capturing[field] = []
+                    started.append(field)
+        if tag not in self.VOID_TAGS:
+            self.stack.append((tag, started))
+
+    def handle_startendtag(self, tag, attrs):
+        # Browsers ignore the "/" in <div/>, the element stays open until its end tag
+        self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if self.skip_depth:
+            if tag in self.SKIP_TAGS:
+                self.skip_depth -= 1
+            return
+        if tag in self.VOID_TAGS:
+            return
+        # Browsers close unclosed children implicitly, so do we
+        open_indexes = [index for index, (open_tag, _) in enumerate(self.stack) if open_tag == tag]
+        if not open_indexes:
+            return
+        self._pop_until(open_indexes[-1])
+        if tag in self.BLOCK_TAGS:
+            self._add_text("\n")
+
+    def _close_implied(self, tag):
+        # e.g. <li>a<li>b: the second item closes the first, instead of being captured as part of it
+        if tag in self.IMPLIED_END_TAGS:
+            self._close_open(*self.IMPLIED_END_TAGS[tag])
+        if tag in self.BLOCK_TAGS and tag != "br":
+            self._close_open({"p"}, self.P_SCOPE_BOUNDARIES)
+
+    def _close_open(self, tags, boundaries):
+        # Close the innermost open element of tags, unless a boundary element comes first
+        for index in range(len(self.stack) - 1, -1, -1):
+            open_tag = self.stack[index][0]
+            if open_tag in tags:
+                self._pop_until(index)
+                return
+            if open_tag in boundaries:
+                return
+
+    def _pop_until(self, index):
+        # Close the open element at index and everything opened inside it
+        while len(self.stack) > index:
+            _, started = self.stack.pop()
+            for field in started:
+                self.results[field] = self._normalize("".join(self.capturing.pop(field)))
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self._add_text(data)
+
+    def close(self):
+        super().close()
+        # Elements still open at the end of the document
+        self._pop_until(0)
+
+    def _add_text(self, text):
+        for chunks in self.capturing.values():
+            chunks.append(text)
+
+    @staticmethod
+    def _normalize(text):
+        # Collapse whitespace like the browser's rendered text, keeping line breaks between blocks
+        lines = (" ".join(line.split()) for line in text.split("\n"))
+        return "\n".join(line for line in lines if line)
@@ -0,0 +1,75 @@
+import os
+import time
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+
+# Pooled HTTP session for the cheap requests we can make without Chrome.
+# Carries the cookies of the browser session stored by SessionStore, reloaded whenever the store changes.
+class HttpSession:
+    USER_AGENT = (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36"
+    )
+
+    def __init__(self, session_store=None):
+        load_dotenv()
+        self.session_store = session_store
+        self.timeout = float(os.getenv("HTTP_TIMEOUT", 10))
+        pool_size = int(os.getenv("HTTP_POOL_SIZE", 8))
+        self.session = requests.Session()
+        # Keep-alive connections are reused across requests (and threads), no retries: callers decide
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "User-Agent": self.USER_AGENT,
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+            "Accept-Language": "de-DE,de;q=0.9,en-US;q=0.8,en;q=0.7",
+        })
+        # Snapshot the cookies were loaded from, and when it expires
+        self._cookies_mtime = None
+        self._cookies_expire_at = 0
+        self._lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        self._load_cookies()
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+    def _load_cookies(self):
+        # Cheap stat on every request, the cookies are only parsed again after a new snapshot
+        if not self.session_store:
+            return
+        try:
+            mtime = os.path.getmtime(self.session_store.session_file)
+        except OSError:
+            # Removed by SessionStore.invalidate()
+            mtime = None
+        with self._lock:
+            if mtime is not None and mtime == self._cookies_mtime and time.time() < self._cookies_expire_at:
+                return
+            session = self.session_store.load() if mtime is not None else None
+            if not session:
+                if self._cookies_mtime is not None:
+                    # The stored login is gone or expired, stop sending its cookies
+                    self.session.cookies.clear()
+                    logger.info(f"Stored session of {self.session_store.site_name} no longer valid, HTTP cookies cleared.")
+                # Not remembered, an unreadable snapshot is read again on the next request
+                self._cookies_mtime = None
+                return
+            for cookie in session["cookies"]:
+                self.session.cookies.set(
+                    cookie["name"], cookie["value"], domain=cookie["domain"], path=cookie.get("path", "/")
+                )
+            self._cookies_mtime = mtime
+            self._cookies_expire_at = session["expires_at"]
+            logger.info(f"HTTP session loaded {len(session['cookies'])} cookies of {self.session_store.site_name}.")
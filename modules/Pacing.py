@@ -0,0 +1,103 @@
+import os
+import sys
+import time
+import random
+import logging
+import threading
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+
+# Central place for all deliberate waits (human-like pauses, waits between attempts, typing cadence).
+# Waits are scaled by the PACING_PROFILE, capped by a per-expose budget and accounted by call site,
+# so each expose ends with a breakdown of where its wall time went.
+class Pacer:
+    # Factor applied to every scaled wait range, balanced keeps the ranges as written in the code
+    PROFILES = {
+        "aggressive": 0.3,
+        "balanced": 1.0,
+        "stealthy": 1.5,
+    }
+    # Call sites listed in the per-expose breakdown
+    REPORT_TOP_SITES = 8
+
+    def __init__(self):
+        load_dotenv()
+        self.profile = os.getenv("PACING_PROFILE", "balanced").lower()
+        if self.profile not in self.PROFILES:
+            logger.warning(f"Unknown PACING_PROFILE {self.profile}, using balanced.")
+            self.profile = "balanced"
+        self.scale = self.PROFILES[self.profile]
+        # Seconds of scaled waits allowed per expose, 0 means no limit
+        self.expose_budget = float(os.getenv("PACING_EXPOSE_BUDGET", 0))
+        self._lock = threading.Lock()
+        self._reset_expose(None)
+
+    def _reset_expose(self, expose_id):
+        self.expose_id = expose_id
+        self.expose_started_at = time.monotonic()
+        # call site -> [seconds, count]
+        self.sites = {}
+        self.waited = 0.0
+        self.scaled_waited = 0.0
+        self.budget_exhausted = False
+
+    def start_expose(self, expose_id):
+        with self._lock:
+            self._reset_expose(expose_id)
+
+    def finish_expose(self):
+        """Log where the expose's wall time went, and start a new (unassigned) accounting period."""
+        with self._lock:
+            wall_time = time.monotonic() - self.expose_started_at
+            sites = sorted(self.sites.items(), key=lambda item: item[1][0], reverse=True)
+            breakdown = ", ".join(
+                f"{site} {seconds:.1f}s ({count}x)" for site, (seconds, count) in sites[:self.REPORT_TOP_SITES]
+            )
+            share = self.waited / wall_time * 100 if wall_time else 0
+            logger.warning(
+                f"Expose {self.expose_id} took {wall_time:.1f}s, {self.waited:.1f}s ({share:.0f}%) deliberate waits "
+                f"with {self.profile} pacing. {breakdown}"
+            )
+            self._reset_expose(None)
+
+    def wait(self, min_seconds, max_seconds, scaled=True, stacklevel=1):
+        """
+        Sleep a random time between min_seconds and max_seconds, accounted to the caller.
+        Scaled waits follow the pacing profile and the expose budget, unscaled ones (e.g. captcha animations) don't.
+        stacklevel selects the frame reported as call site, 1 is the direct caller.
+        """
+        wait_time = random.uniform(min_seconds, max_seconds)
+        if scaled:
+            wait_time *= self.scale
+            if self.expose_budget:
+                remaining = max(self.expose_budget - self.scaled_waited, 0)
+                if wait_time > remaining:
+                    if not self.budget_exhausted:
+                        logger.warning(f"Pacing budget of {self.expose_budget:g}s used up, skipping further waits.")
+                        self.budget_exhausted = True
+                    wait_time = remaining
+        if wait_time > 0:
+            time.sleep(wait_time)
+        self._record(self._call_site(stacklevel + 1), wait_time, scaled)
+        return wait_time
+
+    @staticmethod
+    def _call_site(stacklevel):
+        frame = sys._getframe(stacklevel)
+        code = frame.f_code
+        return f"{getattr(code, 'co_qualname', code.co_name)}:{frame.f_lineno}"
+
+    def _record(self, site, seconds, scaled):
+        with self._lock:
+            self.waited += seconds
+            if scaled:
+                self.scaled_waited += seconds
+            totals = self.sites.setdefault(site, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += 1
+
+
+# One pacer per process, shared by everything that waits
+pacer = Pacer()
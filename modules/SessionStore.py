@@ -0,0 +1,118 @@
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+
+# Snapshot of a logged in website session (cookies and localStorage), kept as versioned JSON in COOKIES_DIR.
+# Restored into new browsers so the login flow only runs when the stored session is really invalid.
+class SessionStore:
+    FORMAT_VERSION = 1
+    # Cookie attributes kept in the snapshot, accepted as is by CDP Network.setCookies
+    COOKIE_KEYS = ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite", "expires")
+
+    def __init__(self, site_name, domain, origin):
+        load_dotenv()
+        self.site_name = site_name
+        self.domain = domain
+        self.origin = origin
+        self.max_age = int(os.getenv("SESSION_MAX_AGE", 7 * 24 * 3600))
+        cookies_dir = os.getenv("COOKIES_DIR", "cookies")
+        os.makedirs(cookies_dir, exist_ok=True)
+        self.session_file = os.path.join(cookies_dir, f"{site_name}_session.json")
+
+    def exists(self):
+        return self.load() is not None
+
+    def save(self, browser):
+        """Snapshot the site's cookies (all subdomains) and, when on the site, its localStorage."""
+        cookies = [
+            {key: cookie[key] for key in self.COOKIE_KEYS if key in cookie}
+            for cookie in browser.execute_cdp_cmd("Network.getAllCookies", {})["cookies"]
+            if cookie["domain"].lstrip(".").endswith(self.domain)
+        ]
+        previous = self.load() or {}
+        local_storage = previous.get("local_storage", {})
+        if browser.current_url.startswith(self.origin):
+            local_storage = browser.execute_script("return Object.assign({}, window.localStorage);")
+        now = time.time()
+        session = {
+            "version": self.FORMAT_VERSION,
+            "site": self.site_name,
+            "origin": self.origin,
+            "saved_at": datetime.now().isoformat(),
+            "expires_at": now + self.max_age,
+            "cookies": cookies,
+            "local_storage": local_storage,
+        }
+        # Written next to the session file and moved over it, readers (other workers, HttpSession) never see half a file
+        temp_file = f"{self.session_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as file:
+            json.dump(session, file, indent=2)
+        os.replace(temp_file, self.session_file)
+        logger.info(f"Session for {self.site_name} saved ({len(cookies)} cookies, {len(local_storage)} storage items).")
+
+    def load(self):
+        """Return the stored session, None if there is none or it is outdated/expired."""
+        if not os.path.isfile(self.session_file):
+            return None
+        try:
+            with open(self.session_file, "r", encoding="utf-8") as file:
+                session = json.load(file)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable session file {self.session_file}: {e}")
+            return None
+        if session.get("version") != self.FORMAT_VERSION:
+            logger.info(f"Ignoring session file {self.session_file} with format version {session.get('version')}.")
+            return None
+        if session.get("expires_at", 0) < time.time():
+            logger.info(f"Stored session for {self.site_name} expired.")
+            return None
+        return session
+
+    def restore(self, browser):
+        """
+        Load the stored session into the browser, returns True if there was one.
+        Cookies are set through CDP (no page load needed), localStorage is filled on the first page of the origin.
+        """
+        session = self.load()
+        if not session:
+            return False
+        now = time.time()
+        # Session cookies have expires -1, they are restored as session cookies
+        cookies = [
+            {key: value for key, value in cookie.items() if not (key == "expires" and value < 0)}
+            for cookie in session["cookies"]
+            if cookie.get("expires", -1) < 0 or cookie["expires"] > now
+        ]
+        if not cookies:
+            logger.info(f"All stored cookies for {self.site_name} expired.")
+            return False
+        browser.execute_cdp_cmd("Network.setCookies", {"cookies": cookies})
+        if session["local_storage"]:
+            # Once per tab (sessionStorage flag), so the site's own later changes are not overwritten
+            browser.execute_cdp_cmd(
+                "Page.addScriptToEvaluateOnNewDocument",
+                {
+                    "source": f"""
+                    if (location.origin === {json.dumps(self.origin)} && !sessionStorage.getItem("sessionRestored")) {{
+                        for (const [key, value] of Object.entries({json.dumps(session["local_storage"])})) {{
+                            localStorage.setItem(key, value);
+                        }}
+                        sessionStorage.setItem("sessionRestored", "1");
+                    }}
+                    """
+                },
+            )
+        logger.info(f"Session for {self.site_name} from {session['saved_at']} restored ({len(cookies)} cookies).")
+        return True
+
+    def invalidate(self):
+        if os.path.isfile(self.session_file):
+            os.remove(self.session_file)
+            logger.info(f"Stored session for {self.site_name} removed.")
@@ -1,7 +1,10 @@
 import os
 import time
 import random
+import json
 import pickle
+import shutil
+import fnmatch
 import logging
 from pathlib import Path
 from datetime import datetime
@@ -12,19 +15,73 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
+from webdriver_manager.core.os_manager import OperationSystemManager, ChromeType
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.desired_capabilities import DesiredCapabilities
 from selenium.common.exceptions import NoSuchElementException, ElementClickInterceptedException
 from selenium_stealth import stealth
 
 from dotenv import load_dotenv
+from modules.Pacing import pacer
 
 logger = logging.getLogger(__name__)
 
 class StealthBrowser(webdriver.Chrome):
-    def __init__(self):
+    # Profile folders that belong to a running Chrome instance and must not be copied
+    PROFILE_CLONE_IGNORE = ("Singleton*", "lockfile", "*.lock", "LOCK", "Cache", "Code Cache", "GPUCache", "Crashpad")
+    # Fast load profile: resources we never need for scraping and applying (CDP URL patterns, * is a wildcard)
+    FAST_LOAD_BLOCKED_URLS = (
+        "*pictures.immobilienscout24.de*",
+        "*.woff*",
+        "*.ttf*",
+        "*.mp4*",
+        "*google-analytics.com*",
+        "*googletagmanager.com*",
+        "*doubleclick.net*",
+        "*googlesyndication.com*",
+        "*facebook.net*",
+        "*hotjar.com*",
+        "*criteo.com*",
+        "*maps.googleapis.com*",
+        "*maps.gstatic.com*",
+        "*api.mapbox.com*",
+        "*tile.openstreetmap.org*",
+    )
+    # Requests the captcha providers make, a blocked URL pattern must not match any of them
+    CAPTCHA_SAMPLE_URLS = (
+        "https://gcaptcha4.geetest.com/load?captcha_id=x",
+        "https://static.geetest.com/v4/gt4.js",
+        "https://static.geetest.com/captcha_v4/policy/x/bg/x.png",
+        "https://www.google.com/recaptcha/api.js",
+        "https://www.google.com/recaptcha/api2/anchor?k=x",
+        "https://www.gstatic.com/recaptcha/releases/x/recaptcha__de.js",
+        "https://x.token.awswaf.com/x/challenge.js",
+        "https://x.captcha.awswaf.com/x/captcha.js",
+        "https://x.captcha.awswaf.com/x/problem?kind=visual",
+    )
+
+    def __init__(self, profile_dir=None, debugging_port=None, fast_load=None):
+        # Used by BrowserSession to decide when to recycle the browser, and for the time to first page
+        self.started_at = time.monotonic()
+        self.pages_loaded = 0
         # Load environment variables
         load_dotenv()
+        # Each running Chrome needs its own profile folder and debugging port
+        #you can find your user folder opening chrome and navigating to chrome://version
+        self.profile_dir = profile_dir or os.getenv(
+            "CHROME_PROFILE_DIR", r"C:\Users\flatmaster\AppData\Local\Google\Chrome\User Data\Default"
+        )
+        self.debugging_port = debugging_port or int(os.getenv("CHROME_DEBUGGING_PORT", 9222))
+        # Opt-in: block heavy resources and return from get() once the DOM is ready
+        if fast_load is None:
+            fast_load = os.getenv("BROWSER_FAST_LOAD", "False").lower() == "true"
+        self.fast_load = fast_load
+        # How type_text fills fields: human (char by char), chunked (a few chars per keystroke burst)
+        # or bulk (long values are inserted at once, firing input/change events)
+        self.typing_strategy = os.getenv("TYPING_STRATEGY", "human").lower()
+        self.bulk_typing_min_length = int(os.getenv("BULK_TYPING_MIN_LENGTH", 200))
+        # Wall time spent in type_text, callers measure the difference
+        self.typing_seconds = 0.0
         self.cookies_dir = os.getenv("COOKIES_DIR", "cookies")
         os.makedirs(self.cookies_dir, exist_ok=True)
 
@@ -46,18 +103,19 @@ class StealthBrowser(webdriver.Chrome):
         options.add_argument("--disable-web-security")
         options.add_argument("--disable-dev-shm-usage")
         options.add_argument("--disable-extensions")
-        options.add_argument("--remote-debugging-port=9222")
-    	
-        #you can find your user folder opening chrome and navigating to chrome://version
-        options.add_argument(r"--user-data-dir=C:\Users\flatmaster\AppData\Local\Google\Chrome\User Data\Default")
+        options.add_argument(f"--remote-debugging-port={self.debugging_port}")
+        options.add_argument(f"--user-data-dir={self.profile_dir}")
 
         options.add_argument(
             "--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
             "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36"
         )
+        if self.fast_load:
+            # get() returns at DOMContentLoaded instead of waiting for every subresource
+            options.page_load_strategy = "eager"
         
-        # Use ChromeDriverManager to install and set up the driver service
-        driver_service = Service(ChromeDriverManager().install())
+        # The driver path is cached, ChromeDriverManager only runs when Chrome was updated
+        driver_service = Service(self.resolve_driver_path())
 
         # Initialize the WebDriver with the specified service and options
         super().__init__(service=driver_service, options=options)
@@ -71,23 +129,118 @@ class StealthBrowser(webdriver.Chrome):
             fix_hairline=True,
             )
         self.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+        if self.fast_load:
+            self.set_resource_blocking(True)
 
         
         self.maximize_window()
+        logging.info(f"Browser started in {time.monotonic() - self.started_at:.1f}s")
+
+    def get(self, url):
+        self.pages_loaded += 1
+        super().get(url)
+        if self.pages_loaded == 1:
+            logging.info(f"Time to first page: {time.monotonic() - self.started_at:.1f}s")
+
+    def set_resource_blocking(self, enabled):
+        """Block (or unblock) the fast load URL patterns for all following requests."""
+        patterns = self.get_blocked_url_patterns() if enabled else []
+        self.execute_cdp_cmd("Network.enable", {})
+        self.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+        logging.info(f"Blocking {len(patterns)} URL patterns")
+
+    @staticmethod
+    def get_blocked_url_patterns():
+        """
+        Block-list from BROWSER_BLOCKED_URLS (comma separated) or FAST_LOAD_BLOCKED_URLS,
+        without the patterns that would block captcha providers.
+        """
+        configured = os.getenv("BROWSER_BLOCKED_URLS")
+        if configured:
+            patterns = [pattern.strip() for pattern in configured.split(",") if pattern.strip()]
+        else:
+            patterns = list(StealthBrowser.FAST_LOAD_BLOCKED_URLS)
+        allowed = []
+        for pattern in patterns:
+            captcha_urls = [url for url in StealthBrowser.CAPTCHA_SAMPLE_URLS if fnmatch.fnmatchcase(url, pattern)]
+            if captcha_urls:
+                logging.warning(f"Not blocking {pattern}, captchas need {captcha_urls[0]}")
+            else:
+                allowed.append(pattern)
+        return allowed
+
+    @staticmethod
+    def resolve_driver_path():
+        """
+        Return the ChromeDriver path for the installed Chrome.
+        The path is cached in CHROMEDRIVER_MANIFEST and reused while the Chrome major version is unchanged,
+        so the driver manager (and its network lookups) only runs after a Chrome update.
+        """
+        manifest_file = os.getenv("CHROMEDRIVER_MANIFEST", "chromedriver_manifest.json")
+        chrome_version = OperationSystemManager().get_browser_version_from_os(ChromeType.GOOGLE)
+        chrome_major = chrome_version.split(".")[0] if chrome_version else None
+        manifest = {}
+        if os.path.isfile(manifest_file):
+            try:
+                with open(manifest_file, "r") as file:
+                    manifest = json.load(file)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable ChromeDriver manifest {manifest_file}: {e}")
+        cached_path = manifest.get("driver_path")
+        cached_valid = bool(cached_path) and os.path.isfile(cached_path)
+        # Chrome version unknown: trust the cache rather than going online
+        if cached_valid and (chrome_major is None or manifest.get("chrome_major") == chrome_major):
+            logging.info(f"Using cached ChromeDriver {cached_path} (Chrome {manifest.get('chrome_version')})")
+            return cached_path
+
+        logging.info(f"Resolving ChromeDriver for Chrome {chrome_version}...")
+        try:
+            driver_path = ChromeDriverManager().install()
+        except Exception as e:
+            if not cached_valid:
+                raise
+            # Offline or rate limited, an older driver usually still works for a while
+            logging.warning(f"ChromeDriver download failed ({e}), using cached {cached_path}")
+            return cached_path
+        manifest = {
+            "chrome_version": chrome_version,
+            "chrome_major": chrome_major,
+            "driver_path": driver_path,
+            "resolved_at": datetime.now().isoformat(),
+        }
+        with open(manifest_file, "w") as file:
+            json.dump(manifest, file, indent=2)
+        return driver_path
 
     def kill(self):
         logging.info("Killing browser")
         self.quit()
 
+    @staticmethod
+    def clone_profile(template_dir, target_dir):
+        """
+        Create target_dir as a copy of the template Chrome profile, if it does not exist yet.
+        Existing clones are kept, so each worker keeps its own cookies and login between runs.
+        """
+        if os.path.isdir(target_dir):
+            return target_dir
+        if os.path.isdir(template_dir):
+            logging.info(f"Cloning Chrome profile {template_dir} to {target_dir}")
+            shutil.copytree(template_dir, target_dir, ignore=shutil.ignore_patterns(*StealthBrowser.PROFILE_CLONE_IGNORE))
+        else:
+            logging.warning(f"Template Chrome profile {template_dir} not found, starting {target_dir} empty.")
+            os.makedirs(target_dir, exist_ok=True)
+        return target_dir
+
     def wait_for_user(self):
         #self.execute_script("window.stop();")
         input("Waiting for user, press Enter to continue...")
 
     @staticmethod
     def random_wait(min_seconds=0.5, max_seconds=3):
-        wait_time = random.uniform(min_seconds, max_seconds)
-        logging.info(f"Waiting for {wait_time:.2f} seconds...")
-        time.sleep(wait_time)
+        # Scaled by the pacing profile and accounted to our caller
+        wait_time = pacer.wait(min_seconds, max_seconds, stacklevel=2)
+        logging.info(f"Waited for {wait_time:.2f} seconds")
 
     def safe_find_element(self, by, value):
         try:
@@ -95,6 +248,23 @@ class StealthBrowser(webdriver.Chrome):
         except Exception:
             return "Unknown"
 
+    def extract_fields(self, field_map):
+        """
+        Read the text of many elements in a single WebDriver round trip.
+        field_map maps a field name to a CSS selector, returns {field: text}, None for missing elements.
+        """
+        return self.execute_script(
+            """
+            const fields = {};
+            for (const [field, selector] of Object.entries(arguments[0])) {
+                const element = document.querySelector(selector);
+                fields[field] = element ? element.innerText.trim() : null;
+            }
+            return fields;
+            """,
+            field_map,
+        )
+
     def random_mouse_movements(self, element):
         action = ActionChains(self)
         for _ in range(random.randint(2, 5)):
@@ -177,7 +347,52 @@ class StealthBrowser(webdriver.Chrome):
     def send_keys_human_like(self, field, value, min_delay=0.01, max_delay=0.25):
         for char in value:
             field.send_keys(char)
-            time.sleep(random.uniform(min_delay, max_delay))
+            pacer.wait(min_delay, max_delay)
+
+    def send_keys_chunked(self, field, value, min_chunk=3, max_chunk=12, min_delay=0.05, max_delay=0.3):
+        # Bursts of a few characters, like a fast typist, longer pause after a sentence
+        position = 0
+        while position < len(value):
+            chunk = value[position:position + random.randint(min_chunk, max_chunk)]
+            field.send_keys(chunk)
+            position += len(chunk)
+            if chunk[-1] in ".!?\n":
+                pacer.wait(min_delay * 3, max_delay * 3)
+            else:
+                pacer.wait(min_delay, max_delay)
+
+    def insert_text(self, field, value):
+        """
+        Set the whole value at once through the native value setter, so frameworks like React see the change,
+        then fire input/change events. The last character is typed for real to trigger the key handlers.
+        """
+        self.execute_script(
+            """
+            const field = arguments[0];
+            const prototype = field.tagName === "TEXTAREA" ? HTMLTextAreaElement.prototype : HTMLInputElement.prototype;
+            Object.getOwnPropertyDescriptor(prototype, "value").set.call(field, arguments[1]);
+            field.dispatchEvent(new Event("input", {bubbles: true}));
+            field.dispatchEvent(new Event("change", {bubbles: true}));
+            """,
+            field,
+            value[:-1],
+        )
+        if value:
+            field.send_keys(value[-1])
+
+    def type_text(self, field, value):
+        """Fill field with value using the configured TYPING_STRATEGY."""
+        start_time = time.perf_counter()
+        try:
+            if self.typing_strategy == "bulk" and len(value) >= self.bulk_typing_min_length:
+                self.insert_text(field, value)
+            elif self.typing_strategy in ("bulk", "chunked"):
+                # Short fields are typed in chunks in bulk mode too
+                self.send_keys_chunked(field, value)
+            else:
+                self.send_keys_human_like(field, value)
+        finally:
+            self.typing_seconds += time.perf_counter() - start_time
 
     def click_with_random_offset(self, element):
         """
@@ -0,0 +1,87 @@
+import os
+import signal
+import socket
+import logging
+import multiprocessing
+from dotenv import load_dotenv
+from modules.Database import ExposeDB
+from modules.ExposeWorker import ExposeWorker
+from modules.StealthBrowser import StealthBrowser
+
+logger = logging.getLogger(__name__)
+
+# Spawned processes behave the same on Windows, Linux and macOS
+mp_context = multiprocessing.get_context("spawn")
+
+
+# Runs N ExposeWorkers in separate processes, each with its own Chrome profile
+# (cloned from the template profile) and debugging port.
+# Workers share flats.db, the expose leases make sure each expose goes to one worker only.
+class WorkerPool:
+    def __init__(self, size, log_initializer=None):
+        load_dotenv()
+        self.size = size
+        # Shared with the worker processes, set by stop() or by a signal received in a worker
+        self.stop_event = mp_context.Event()
+        self.log_initializer = log_initializer
+        self.template_profile = os.getenv(
+            "CHROME_PROFILE_DIR", r"C:\Users\flatmaster\AppData\Local\Google\Chrome\User Data\Default"
+        )
+        self.profiles_dir = os.path.abspath(os.getenv("CHROME_WORKER_PROFILES_DIR", "chrome_profiles"))
+        self.base_port = int(os.getenv("CHROME_DEBUGGING_PORT", 9222))
+        # Notifications from the email fetcher, one token wakes up one worker
+        self.wake_queue = mp_context.Queue()
+        self.processes = []
+
+    def start(self):
+        os.makedirs(self.profiles_dir, exist_ok=True)
+        for index in range(self.size):
+            profile_dir = StealthBrowser.clone_profile(
+                self.template_profile, os.path.join(self.profiles_dir, f"worker_{index}")
+            )
+            process = mp_context.Process(
+                target=run_worker_process,
+                args=(index, profile_dir, self.base_port + index, self.stop_event, self.wake_queue, self.log_initializer),
+                name=f"BrowserWorker-{index}",
+            )
+            process.start()
+            self.processes.append(process)
+        logger.warning(f"Started {self.size} browser workers.")
+
+    def wait(self, stop_event):
+        """Block until stop_event is set or all workers exited."""
+        while not stop_event.wait(1):
+            if not any(process.is_alive() for process in self.processes):
+                logger.error("All browser workers exited.")
+                break
+
+    def stop(self):
+        # Workers finish their current expose before exiting
+        self.stop_event.set()
+        for process in self.processes:
+            process.join()
+            logger.info(f"{process.name} exited with code {process.exitcode}.")
+
+
+def run_worker_process(index, profile_dir, debugging_port, stop_event, wake_queue, log_initializer=None):
+    if log_initializer:
+        log_initializer()
+
+    def request_stop(signum, frame):
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    db = ExposeDB()
+    worker = ExposeWorker(
+        db,
+        stop_event,
+        worker_id=f"{socket.gethostname()}-{os.getpid()}-w{index}",
+        profile_dir=profile_dir,
+        debugging_port=debugging_port,
+    )
+    try:
+        worker.run(wake_queue)
+    finally:
+        db.close()
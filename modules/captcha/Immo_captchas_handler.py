@@ -3,7 +3,6 @@ import re
 from io import BytesIO
 import base64
 import logging
-from time import sleep
 from dotenv import load_dotenv
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.action_chains import ActionChains
@@ -15,6 +14,7 @@ from selenium.webdriver.support.ui import Select
 from selenium.common.exceptions import NoSuchElementException, TimeoutException
 from modules.captcha.twocaptcha_solver import TwoCaptchaSolver, GeetestResponse, RecaptchaResponse, CaptchaUnsolvableError, CaptchaBalanceEmpty
 from modules.StealthBrowser import StealthBrowser
+from modules.Pacing import pacer
 
 logger = logging.getLogger(__name__)
 
@@ -111,7 +111,7 @@ class ImmoCaptchaHandler:
                       f'geetest_validate: "{captcha_response.validate}",'
                       f'data: "{data}"}});')
             driver.execute_script(script)
-            sleep(2)
+            pacer.wait(2, 2, scaled=False)
         except CaptchaUnsolvableError:
             driver.refresh()
             raise
@@ -127,7 +127,7 @@ class ImmoCaptchaHandler:
         """
         try:
             driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            sleep(1)
+            pacer.wait(1, 1, scaled=False)
 
             # Access shadow root
             shadow_element = driver.execute_script(
@@ -140,9 +140,9 @@ class ImmoCaptchaHandler:
             select_l = my_img.find_element(By.TAG_NAME, "select")
             Select(select_l).select_by_visible_text("English")
 
-            sleep(3)
+            pacer.wait(3, 3, scaled=False)
             driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            sleep(1)
+            pacer.wait(1, 1, scaled=False)
 
             # Take screenshot
             shadow_element = driver.execute_script(
@@ -172,15 +172,15 @@ class ImmoCaptchaHandler:
                 # Offsetting from top-left of the puzzle
                 actions.move_to_element_with_offset(my_img, x_coord - 160, y_coord - 211).click()
                 actions.perform()
-                sleep(0.3)
+                pacer.wait(0.3, 0.3, scaled=False)
                 actions.reset_actions()
 
-            sleep(1)
+            pacer.wait(1, 1, scaled=False)
             try:
                 confirm_button = my_img.find_element(By.ID, "amzn-btn-verify-internal")
                 actions.move_to_element_with_offset(confirm_button, 40, 15).click()
                 actions.perform()
-                sleep(4)
+                pacer.wait(4, 4, scaled=False)
             except:
                 return
 
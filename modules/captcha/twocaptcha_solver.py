@@ -2,10 +2,11 @@
 import json
 from dataclasses import dataclass
 from typing import Dict
-from time import sleep
+import time
 import logging
 import requests
-from twocaptcha import TwoCaptcha
+from twocaptcha import TwoCaptcha, NetworkException, TimeoutException
+from modules.Pacing import pacer
 
 logger = logging.getLogger(__name__)
 
@@ -71,9 +72,17 @@ class TwoCaptchaSolver():
 
     def get_awswaf_solution(self, image):
         logging.info("Trying to solve amazon.")
-        solver = TwoCaptcha(self.api_key, defaultTimeout=50, pollingInterval=5)
-        result = solver.coordinates(image, lang='en')
-        return result
+        solver = TwoCaptcha(self.api_key)
+        captcha_id = solver.send(coordinatescaptcha=1, method="base64", body=image, lang="en")
+        # Polled here instead of solver.coordinates(), so the waits are accounted by the pacer
+        deadline = time.monotonic() + 50
+        while time.monotonic() < deadline:
+            try:
+                return {"captchaId": captcha_id, "code": solver.get_result(captcha_id)}
+            except NetworkException:
+                # Not ready yet
+                pacer.wait(5, 5, scaled=False)
+        raise TimeoutException("timeout 50 exceeded")
 
     def __submit_2captcha_request(self, params: Dict[str, str]) -> str:
         submit_url = "http://2captcha.com/in.php"
@@ -98,7 +107,7 @@ class TwoCaptchaSolver():
 
             if "CAPCHA_NOT_READY" in retrieve_response.text:
                 logging.info("Captcha is not ready yet, waiting...")
-                sleep(5)
+                pacer.wait(5, 5, scaled=False)
                 continue
 
             if "ERROR_CAPTCHA_UNSOLVABLE" in retrieve_response.text:
@@ -1,7 +1,10 @@
 import sqlite3
 import os
+import random
 import logging
-from datetime import datetime
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from modules.Expose import Expose
 
@@ -13,15 +16,82 @@ class ExposeNotFoundError(Exception):
 class ExposeUpdateError(Exception):
     pass
 
+# Exposes waiting for a worker: not done, not given up, due for an attempt and not leased by a live worker
+QUEUE_CONDITION = """
+    processed=0 AND failures < :max_attempts
+    AND (next_attempt_at IS NULL OR next_attempt_at <= :now)
+    AND (lease_owner IS NULL OR lease_expires_at < :now)
+"""
+
+# Expose fields describing the processing rather than the listing, never written by update_expose_details
+PROCESSING_FIELDS = ("expose_id", "source", "processed", "failures", "received_at", "applied_at", "last_step", "step_log")
+
+# Retry delays per failure class as (first delay, maximum delay) in seconds,
+# the delay doubles with every failure of the expose
+RETRY_BACKOFF = {
+    "default": (120, 2 * 3600),
+    "page": (120, 2 * 3600),            # error/home page, expose title not found
+    "captcha": (300, 6 * 3600),         # captcha could not be solved
+    "login": (600, 6 * 3600),           # login needed or failed
+    "application": (60, 3600),          # contact form could not be filled or sent
+    "crash": (300, 6 * 3600),           # unexpected exception while processing
+}
+
 class ExposeDB:
     def __init__(self, db_file="flats.db", max_attempts=50):
         load_dotenv()
         self.db_file = os.getenv("DB_FILE", db_file)
         self.max_attempts_expose = int(os.getenv("MAX_ATTEMPTS_EXPOSE", max_attempts))
+        # Seconds a writer waits for a lock held by another thread/process before failing
+        self.busy_timeout = float(os.getenv("DB_BUSY_TIMEOUT", 30))
+        # One long-lived connection per thread, sqlite3 connections must not be shared across threads
+        self._local = threading.local()
+        # Statements built once, so sqlite3's statement cache serves them on every call
+        expose_fields = list(Expose(expose_id=None).to_dict().keys())
+        self._insert_query = f"""
+            INSERT INTO exposes ({', '.join(expose_fields)})
+            VALUES ({', '.join(['?'] * len(expose_fields))})
+        """
+        self._insert_new_query = self._insert_query.replace("INSERT INTO", "INSERT OR IGNORE INTO")
+        self._update_query = f"""
+            UPDATE exposes SET {', '.join(f"{key}=?" for key in expose_fields)} WHERE expose_id=?
+        """
+        # Listing details (and scraped_at), scraped by the browser or over HTTP
+        self.detail_fields = [key for key in expose_fields if key not in PROCESSING_FIELDS]
+        # Runs store the expose object they were given, details stored meanwhile (HTTP scrape) must survive that
+        run_assignments = ', '.join(
+            f"{key}=CASE WHEN scraped_at IS NULL THEN ? ELSE {key} END" if key in self.detail_fields else f"{key}=?"
+            for key in expose_fields
+        )
+        self._complete_query = f"""
+            UPDATE exposes SET {run_assignments},
+                next_attempt_at=?, lease_owner=NULL, lease_expires_at=NULL
+            WHERE expose_id=? AND (lease_owner=? OR lease_owner IS NULL)
+        """
+        self._checkpoint_query = f"""
+            UPDATE exposes SET {run_assignments}
+            WHERE expose_id=? AND lease_owner=?
+        """
+        self.expose_fields = expose_fields
         self.init_db()
 
     def _get_connection(self):
-        return sqlite3.connect(self.db_file)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=self.busy_timeout, cached_statements=128)
+            # WAL lets readers and a writer work concurrently, NORMAL sync is safe in WAL mode
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Close the calling thread's connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
 
     def init_db(self):
         fields = ', '.join(
@@ -32,10 +102,93 @@ class ExposeDB:
                 id INTEGER PRIMARY KEY AUTOINCREMENT, {fields}
             );
         """
+        # Mailbox synchronization checkpoints (see EmailFetcher)
+        create_sync_table_query = """
+            CREATE TABLE IF NOT EXISTS mailbox_sync (
+                mailbox TEXT PRIMARY KEY,
+                uidvalidity INTEGER NOT NULL,
+                last_uid INTEGER NOT NULL
+            );
+        """
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute(create_table_query)
+            cursor.execute(create_sync_table_query)
             logging.info("Database created and initialized.")
+        self._migrate()
+
+    ###############################
+    ##### SCHEMA MIGRATIONS #######
+    ###############################
+
+    # CREATE TABLE IF NOT EXISTS never changes an existing flats.db, schema changes go here.
+    # PRAGMA user_version stores how many of these migrations the file has already received,
+    # new migrations must be appended at the end of the list.
+    def _migrations(self):
+        return [
+            self._migration_expose_indexes,
+            self._migration_expose_leases,
+            self._migration_expose_retry_schedule,
+            self._migration_expose_steps,
+        ]
+
+    def _migrate(self):
+        conn = self._get_connection()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        migrations = self._migrations()
+        for target, migration in enumerate(migrations[version:], start=version + 1):
+            logging.warning(f"Migrating database schema to version {target}: {migration.__doc__.strip()}")
+            # Each migration and its version bump are applied atomically
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                migration(conn.cursor())
+                conn.execute(f"PRAGMA user_version = {target}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def _migration_expose_indexes(self, cursor):
+        """Unique index on expose_id and partial index on the unprocessed queue."""
+        # Older databases may contain duplicates, keep the most advanced row of each expose
+        cursor.execute("""
+            DELETE FROM exposes WHERE id NOT IN (
+                SELECT id FROM (
+                    SELECT id, ROW_NUMBER() OVER (PARTITION BY expose_id ORDER BY processed DESC, id) AS position
+                    FROM exposes
+                ) WHERE position = 1
+            )
+        """)
+        if cursor.rowcount:
+            logging.warning(f"Removed {cursor.rowcount} duplicated exposes.")
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_exposes_expose_id ON exposes (expose_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_exposes_unprocessed ON exposes (failures) WHERE processed = 0")
+
+    def _migration_expose_leases(self, cursor):
+        """Lease columns turning exposes into a work queue shared by several workers."""
+        self._add_column(cursor, "exposes", "lease_owner", "TEXT")
+        self._add_column(cursor, "exposes", "lease_expires_at", "TIMESTAMP")
+
+    def _migration_expose_retry_schedule(self, cursor):
+        """next_attempt_at column for exponential retry backoff."""
+        self._add_column(cursor, "exposes", "next_attempt_at", "TIMESTAMP")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_exposes_due ON exposes (next_attempt_at) WHERE processed = 0")
+
+    def _migration_expose_steps(self, cursor):
+        """last_step and step_log columns for step-resumable processing."""
+        self._add_column(cursor, "exposes", "last_step", "TEXT")
+        self._add_column(cursor, "exposes", "step_log", "TEXT")
+
+    @staticmethod
+    def _add_column(cursor, table, column, sql_type):
+        # Fresh databases may already have the column from init_db
+        cursor.execute(f"PRAGMA table_info({table})")
+        if column not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {sql_type}")
+
+    def _row_to_expose(self, row):
+        # Columns are matched by name, the table also holds queue bookkeeping
+        return Expose(**{key: row[key] for key in row.keys() if key in self.expose_fields})
 
     def _get_sql_type(self, value):
         if isinstance(value, int):
@@ -56,24 +209,33 @@ class ExposeDB:
     def insert_expose(self, expose):
         with self._get_connection() as conn:
             cursor = conn.cursor()
-            fields = ', '.join(expose.to_dict().keys())
-            placeholders = ', '.join(['?'] * len(expose.to_dict()))
             values = tuple(expose.to_dict().values())
-            cursor.execute(f"""
-                INSERT INTO exposes ({fields})
-                VALUES ({placeholders})
-            """, values)
+            cursor.execute(self._insert_query, values)
             logging.info(f"Expose {expose.expose_id} inserted successfully.")
             return True
 
+    def insert_new_exposes(self, exposes):
+        """
+        Bulk insert new exposes from (expose_id, source) pairs in a single transaction.
+        IDs already in the database (or repeated in the batch) are skipped by the unique index.
+        Returns the number of exposes actually inserted.
+        """
+        rows = [Expose(expose_id=expose_id, source=source).to_dict() for expose_id, source in exposes]
+        if not rows:
+            return 0
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            changes_before = conn.total_changes
+            cursor.executemany(self._insert_new_query, [tuple(row.values()) for row in rows])
+            inserted = conn.total_changes - changes_before
+            logging.info(f"Inserted {inserted} new exposes out of {len(rows)}.")
+            return inserted
+
     def update_expose(self, expose):
         with self._get_connection() as conn:
             cursor = conn.cursor()
-            fields = ', '.join(f"{key}=?" for key in expose.to_dict().keys())
             values = tuple(expose.to_dict().values()) + (expose.expose_id,)
-            cursor.execute(f"""
-                UPDATE exposes SET {fields} WHERE expose_id=?
-            """, values)
+            cursor.execute(self._update_query, values)
             if cursor.rowcount:
                 logging.info(f"Expose {expose.expose_id} updated successfully.")
                 return True
@@ -88,15 +250,14 @@ class ExposeDB:
             """, (expose_id,))
             row = cursor.fetchone()
             if row:
-                return Expose(*row[1:])
+                return self._row_to_expose(row)
             raise ExposeNotFoundError(f"Expose {expose_id} not found.")
 
     def expose_exists(self, expose_id):
-        try:
-            self.get_expose(expose_id)
-            return True
-        except ExposeNotFoundError:
-            return False
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM exposes WHERE expose_id=?", (expose_id,))
+            return cursor.fetchone() is not None
 
     def delete_expose_by_id(self, expose_id):
         with self._get_connection() as conn:
@@ -139,26 +300,233 @@ class ExposeDB:
 
     def get_unprocessed_exposes(self):
         with self._get_connection() as conn:
-            conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
-            cursor.execute("SELECT * FROM exposes WHERE processed=0 AND failures < ?", (self.max_attempts_expose,))
+            cursor.execute(f"SELECT * FROM exposes WHERE {QUEUE_CONDITION}", self._queue_params())
             rows = cursor.fetchall()
-            exposes = [Expose(*row[1:]) for row in rows]
+            exposes = [self._row_to_expose(row) for row in rows]
             logging.info(f"Fetched {len(exposes)} unprocessed exposes.")
             return exposes
-        
+
+    def get_unscraped_exposes(self, limit=20):
+        """Waiting exposes without scraped details, newest first (see ExposeWorker.prefetch_details)."""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT * FROM exposes WHERE {QUEUE_CONDITION} AND scraped_at IS NULL
+                ORDER BY received_at DESC LIMIT :limit
+            """, {**self._queue_params(), "limit": limit})
+            return [self._row_to_expose(row) for row in cursor.fetchall()]
+
+    def update_expose_details(self, expose_id, details):
+        """
+        Store scraped details ({field: value}) of an expose that has not been scraped yet.
+        Only the given Expose fields are written, processing state and lease are left untouched,
+        so this is safe while the expose is queued or leased to another worker.
+        """
+        columns = [field for field in details if field in self.detail_fields]
+        if not columns:
+            return False
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"UPDATE exposes SET {', '.join(f'{column}=?' for column in columns)} "
+                f"WHERE expose_id=? AND scraped_at IS NULL",
+                tuple(details[column] for column in columns) + (expose_id,),
+            )
+            return bool(cursor.rowcount)
+
+    def load_expose_details(self, expose):
+        """
+        Copy details stored since the expose was read (e.g. scraped over HTTP while it was queued) into it.
+        Returns True if there were any.
+        """
+        if expose.scraped_at is not None:
+            return False
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT {', '.join(self.detail_fields)} FROM exposes WHERE expose_id=? AND scraped_at IS NOT NULL",
+                (expose.expose_id,),
+            )
+            row = cursor.fetchone()
+        if not row:
+            return False
+        for key in row.keys():
+            setattr(expose, key, row[key])
+        return True
+
+    ###############################
+    ######### WORK QUEUE ##########
+    ###############################
+
+    def _queue_params(self):
+        return {"max_attempts": self.max_attempts_expose, "now": datetime.utcnow()}
+
+    def claim_next(self, worker_id, lease_seconds=900, exclude=(), scheduler=None):
+        """
+        Atomically lease the next waiting expose to worker_id for lease_seconds.
+        Other workers will not get it until it is completed, failed or the lease expires.
+        Exposes whose ID is in exclude (e.g. already attempted in this cycle) are skipped.
+        Without a scheduler exposes are served in arrival order, otherwise the scheduler
+        picks one among all waiting exposes (see ExposeScheduler).
+        Returns the claimed Expose, or None if the queue is empty.
+        """
+        conn = self._get_connection()
+        with conn:
+            # Take the write lock before reading, so two workers can not pick the same row
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.cursor()
+            params = self._queue_params()
+            excluded = ', '.join(f":exclude{i}" for i in range(len(exclude)))
+            params.update({f"exclude{i}": expose_id for i, expose_id in enumerate(exclude)})
+            cursor.execute(f"""
+                SELECT * FROM exposes WHERE {QUEUE_CONDITION} AND expose_id NOT IN ({excluded})
+                ORDER BY id {'' if scheduler else 'LIMIT 1'}
+            """, params)
+            rows = cursor.fetchall()
+            if not rows:
+                return None
+            if scheduler:
+                # Waiting since the retry became due, or since the alert arrived
+                candidates = [(self._row_to_expose(row), row["next_attempt_at"] or row["received_at"]) for row in rows]
+                expose = scheduler.pick(candidates, params["now"])
+                row = next(row for row in rows if row["expose_id"] == expose.expose_id)
+            else:
+                row = rows[0]
+            if row["lease_owner"]:
+                logging.warning(f"Lease of {row['lease_owner']} on expose {row['expose_id']} expired, reclaiming it.")
+            cursor.execute("""
+                UPDATE exposes SET lease_owner=?, lease_expires_at=? WHERE id=?
+            """, (worker_id, params["now"] + timedelta(seconds=lease_seconds), row["id"]))
+            logging.info(f"Expose {row['expose_id']} claimed by {worker_id}.")
+            return self._row_to_expose(row)
+
+    def renew_lease(self, expose_id, worker_id, lease_seconds=900):
+        """Extend the lease held by worker_id, returns False if the lease was lost."""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE exposes SET lease_expires_at=? WHERE expose_id=? AND lease_owner=?
+            """, (datetime.utcnow() + timedelta(seconds=lease_seconds), expose_id, worker_id))
+            if not cursor.rowcount:
+                logging.warning(f"Lease on expose {expose_id} no longer held by {worker_id}.")
+            return bool(cursor.rowcount)
+
+    @contextmanager
+    def keep_lease(self, expose_id, worker_id, lease_seconds=900):
+        """Renew the lease in the background while the body runs (processing can take minutes)."""
+        stop = threading.Event()
+
+        def renew():
+            while not stop.wait(lease_seconds / 3):
+                try:
+                    self.renew_lease(expose_id, worker_id, lease_seconds)
+                except sqlite3.Error as e:
+                    logging.error(f"Could not renew lease on expose {expose_id}: {e}")
+            self.close()
+
+        renewer = threading.Thread(target=renew, name=f"lease-{expose_id}", daemon=True)
+        renewer.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            renewer.join()
+
+    def release_expired_leases(self):
+        """Free the exposes of crashed workers, returns how many were released."""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE exposes SET lease_owner=NULL, lease_expires_at=NULL
+                WHERE lease_owner IS NOT NULL AND lease_expires_at < ?
+            """, (datetime.utcnow(),))
+            if cursor.rowcount:
+                logging.warning(f"Released {cursor.rowcount} expired expose leases.")
+            return cursor.rowcount
+
+    def checkpoint_expose(self, expose, worker_id):
+        """Store the progress of an expose while it is being processed, the lease is kept."""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            values = tuple(expose.to_dict().values()) + (expose.expose_id, worker_id)
+            cursor.execute(self._checkpoint_query, values)
+            if not cursor.rowcount:
+                logging.warning(f"Checkpoint of expose {expose.expose_id} not stored, lease lost by {worker_id}.")
+            return bool(cursor.rowcount)
+
+    def complete_expose(self, expose, worker_id, failure_class=None):
+        """
+        Acknowledge a finished processing run: store the expose as the processor left it
+        (processed, or with its failures count increased) and release the lease.
+        Unprocessed exposes are scheduled for a retry according to failure_class.
+        """
+        next_attempt_at = None
+        if not expose.processed:
+            next_attempt_at = self._next_attempt_at(expose.expose_id, expose.failures, failure_class)
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            values = tuple(expose.to_dict().values()) + (next_attempt_at, expose.expose_id, worker_id)
+            cursor.execute(self._complete_query, values)
+            if not cursor.rowcount:
+                logging.warning(f"Expose {expose.expose_id} was not completed, lease lost by {worker_id}.")
+                return False
+            logging.info(f"Expose {expose.expose_id} completed by {worker_id}.")
+            return True
+
+    def fail_expose(self, expose_id, worker_id, failure_class="crash"):
+        """Acknowledge a crashed processing run: count a failure, schedule a retry and release the lease."""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT failures FROM exposes WHERE expose_id=?", (expose_id,))
+            row = cursor.fetchone()
+            failures = (row["failures"] if row else 0) + 1
+            cursor.execute("""
+                UPDATE exposes SET failures=?, next_attempt_at=?, lease_owner=NULL, lease_expires_at=NULL
+                WHERE expose_id=? AND (lease_owner=? OR lease_owner IS NULL)
+            """, (failures, self._next_attempt_at(expose_id, failures, failure_class), expose_id, worker_id))
+            if not cursor.rowcount:
+                logging.warning(f"Expose {expose_id} was not failed, lease lost by {worker_id}.")
+            return bool(cursor.rowcount)
+
+    def _next_attempt_at(self, expose_id, failures, failure_class=None):
+        # Exponential backoff with jitter, so retries of many exposes do not line up
+        first_delay, max_delay = RETRY_BACKOFF.get(failure_class or "default", RETRY_BACKOFF["default"])
+        delay = min(max_delay, first_delay * 2 ** max(failures - 1, 0))
+        delay *= random.uniform(0.8, 1.2)
+        logging.info(f"Expose {expose_id} ({failure_class or 'default'} failure #{failures}) retried in {delay / 60:.1f} minutes.")
+        return datetime.utcnow() + timedelta(seconds=delay)
+
+
     def print_all_exposes(self):
         with self._get_connection() as conn:
-            conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM exposes")
             rows = cursor.fetchall()
             for row in rows:
-                print(Expose(*row[1:]))
+                print(self._row_to_expose(row))
 
     def clear_all_exposes(self):
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM exposes")
             conn.commit()
-            logging.warning("All exposes have been cleared.")
\ No newline at end of file
+            logging.warning("All exposes have been cleared.")
+
+    def get_mailbox_checkpoint(self, mailbox):
+        """Returns (uidvalidity, last_uid) stored for the mailbox, or None if it was never synced."""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT uidvalidity, last_uid FROM mailbox_sync WHERE mailbox=?", (mailbox,))
+            row = cursor.fetchone()
+            return (row[0], row[1]) if row else None
+
+    def set_mailbox_checkpoint(self, mailbox, uidvalidity, last_uid):
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO mailbox_sync (mailbox, uidvalidity, last_uid) VALUES (?, ?, ?)
+                ON CONFLICT(mailbox) DO UPDATE SET uidvalidity=excluded.uidvalidity, last_uid=excluded.last_uid
+            """, (mailbox, uidvalidity, last_uid))
+            conn.commit()
+            logging.debug(f"Mailbox {mailbox} checkpoint: UIDVALIDITY={uidvalidity}, last UID={last_uid}.")
@@ -1,4 +1,5 @@
 import os
+import time
 import base64
 import re
 import logging
@@ -31,6 +32,52 @@ class Immobilienscout24_processor(BaseExposeProcessor):
             "error_page": "Fehler",
             "home_page": "ImmoScout24 – Die Nr. 1 für Immobilien"
         }
+    session_origin = "https://www.immobilienscout24.de"
+    preflight_titles = {
+            "expired": (page_titles["offer_expired"], page_titles["offer_deactivated"]),
+            "gated": (page_titles["captcha_wall"], page_titles["login_page"])
+        }
+    # Application flow, see BaseExposeProcessor.process_expose
+    steps = ("navigate", "gate", "scrape", "open_form", "fill", "submit", "confirm")
+    # The contact form only survives retries of fill, submit and confirm, everything else reloads the page.
+    # Scraping is not repeated after a reload, _scrape_expose skips already scraped exposes.
+    resume_steps = {"gate": "navigate", "scrape": "navigate", "open_form": "navigate"}
+    # Once submitted, the application is never sent again, not even by a later run
+    irreversible_steps = ("submit",)
+    step_failure_classes = {
+            "navigate": "page",
+            "gate": "page",
+            "scrape": "page",
+            "open_form": "application",
+            "fill": "application",
+            "submit": "application",
+            "confirm": "application"
+        }
+    # Expose fields scraped from the offer page
+    scrape_fields = {
+            "title": "#expose-title",
+            "location": ".zip-region-and-country",
+            "agent_name": ".truncateChild_5TDve",
+            "real_estate_agency": "p[data-qa='company-name']",
+            "price_kalt": ".is24-preis-value",
+            "square_meters": ".is24qa-wohnflaeche-main",
+            "number_of_rooms": ".is24qa-zi-main",
+            "nebekosten": ".is24qa-nebenkosten",
+            "price_warm": "dd.is24qa-gesamtmiete",
+            "construction_year": ".is24qa-baujahr",
+            "description": ".is24qa-objektbeschreibung",
+            "neighborhood": ".is24qa-lage"
+        }
+    # Listing data the page keeps in a script ("keyValues = {...};"), fills fields missing in the markup
+    embedded_json_pattern = r"keyValues\s*=\s*(\{.*?\});"
+    embedded_json_fields = {
+            "price_kalt": "obj_baseRent",
+            "price_warm": "obj_totalRent",
+            "nebekosten": "obj_serviceCharge",
+            "square_meters": "obj_livingSpace",
+            "number_of_rooms": "obj_noRooms",
+            "construction_year": "obj_yearConstructed"
+        }
 
     def __init__(self, stealthbrowser):
         # Load environment variables
@@ -61,31 +108,50 @@ class Immobilienscout24_processor(BaseExposeProcessor):
         offer_link = f"https://push.search.is24.de/email/expose/{Expose.expose_id}"
         return offer_link
 
-    #updates expose, called in process_expose
-    def _handle_page(self, Expose: Expose):
+    ###############################
+    ########## STEPS ##############
+    ###############################
+
+    # Handles captcha walls, dead offers and login, returns True when we are logged in on a valid offer page
+    def _step_gate(self, Expose: Expose):
         page_title = self.stealth_chrome.title
         logger.info(f"Page title: {page_title}")
         self._accept_cookies()
         if Immobilienscout24_processor.page_titles['captcha_wall'] in page_title:
             captcha_handler = ImmoCaptchaHandler()
-            captcha_handler.handle_captchas(self.stealth_chrome)
+            if not captcha_handler.handle_captchas(self.stealth_chrome):
+                self.failure_class = "captcha"
+                return False
         elif Immobilienscout24_processor.page_titles['offer_expired'] in page_title or Immobilienscout24_processor.page_titles['offer_deactivated'] in page_title:
             logger.info("Offer expired or deactivated, skipping.")
             Expose.processed = True
             logger.info(f"Expose {Expose.expose_id} marked as processed.")
-            return
+            return True
         elif Immobilienscout24_processor.page_titles['login_page'] in page_title:
             logger.warning("Login page detected, attempting login.")
-            self._perform_login()
+            self.failure_class = "login"
+            self.login_performed = self._perform_login() or self.login_performed
         elif Immobilienscout24_processor.page_titles['error_page'] in page_title or Immobilienscout24_processor.page_titles['home_page'] in page_title:
             logger.warning("Error or landed on home page, skipping attempt.")
-            return
+            self.failure_class = "page"
+            return False
         
         # Are we logged in?
         if not self._check_login():
-            self._perform_login()
+            if self.session_restored:
+                logger.warning("Stored session is no longer valid, logging in again.")
+                self.session_store.invalidate()
+                self.session_restored = False
+            self.failure_class = "login"
+            self.login_performed = self._perform_login() or self.login_performed
             # After a login we are redirected to our profile page, abort to start a new attempt and refresh the expose link
-            return
+            return False
+
+        # Keep the session of a fresh login (or of a profile that was already logged in) for the next browsers
+        if self.login_performed or not self.session_saved:
+            self._save_session()
+            self.login_performed = False
+        self.failure_class = None
         
         #Do something random as an human would
         self.stealth_chrome.perform_random_action()
@@ -96,28 +162,45 @@ class Immobilienscout24_processor(BaseExposeProcessor):
         # At this point we could be on a valid offer page, let´s validate
         if not self._has_expose_title():
             # If not there is some issue, abort the attempt
-            return
-        
-        # Validated, let´s scrape it
-        if self._scrape_expose(Expose):
-            # and try to apply
-            self._apply_for_offer(Expose)     
-        return
+            self.failure_class = "page"
+            return False
+        return True
+
+    def _step_scrape(self, Expose: Expose):
+        self._load_stored_details(Expose)
+        return self._scrape_expose(Expose)
+
+    def _step_open_form(self, Expose: Expose):
+        return self._open_application_form(Expose)
+
+    def _step_fill(self, Expose: Expose):
+        return self._fill_application_form(Expose)
+
+    def _step_submit(self, Expose: Expose):
+        return self._submit_application()
+
+    def _step_confirm(self, Expose: Expose):
+        return self._confirm_application(Expose)
 
     ###############################
     ####### IMMO FUNCTIONS ########
     ###############################
     
-    # Check login status based on page elements, returns boolean
+    # Check login status based on page elements (one round trip), returns boolean
     def _check_login(self):
         try:
-            login_header = self.stealth_chrome.find_element(By.CLASS_NAME, "topnavigation__sso-login__header")
-            if login_header and "angemeldet als" in login_header.text:
+            login_header = self.stealth_chrome.execute_script(
+                "const header = document.querySelector('.topnavigation__sso-login__header');"
+                "return header ? header.innerText : null;"
+            )
+            if login_header and "angemeldet als" in login_header:
                 logger.info("User already logged in.")
                 return True
-        except Exception:
-            logger.debug("User does not seems to be logged in")
-            return False
+        except Exception as e:
+            # Page still loading, stale context...: treated as not logged in, like a missing header
+            logger.debug(f"Login check failed: {e}")
+        logger.debug("User does not seems to be logged in")
+        return False
 
     # Performs Login, returns boolean for success    
     def _perform_login(self):
@@ -215,23 +298,14 @@ class Immobilienscout24_processor(BaseExposeProcessor):
         if Expose.scraped_at is None:
             logger.info(f"Scraping Expose {Expose.expose_id}")
             try:
-                offer_title = self.stealth_chrome.safe_find_element(By.ID, "expose-title")
+                # All fields in one round trip, the title tells us if this is an offer page
+                fields = self._extract_fields()
 
-                if offer_title != "Unknown":
+                if fields["title"] != "Unknown":
                     logger.info("Found Offer title, scriping the rest.")
                     logger.info(f"Scrape time: {datetime.utcnow()}")
-                    Expose.title = offer_title
-                    Expose.location = self.stealth_chrome.safe_find_element(By.CLASS_NAME, "zip-region-and-country")
-                    Expose.agent_name = self.stealth_chrome.safe_find_element(By.CLASS_NAME, "truncateChild_5TDve")
-                    Expose.real_estate_agency = self.stealth_chrome.safe_find_element(By.CSS_SELECTOR, "p[data-qa='company-name']")
-                    Expose.price_kalt = self.stealth_chrome.safe_find_element(By.CLASS_NAME, "is24-preis-value")
-                    Expose.square_meters = self.stealth_chrome.safe_find_element(By.CLASS_NAME, "is24qa-wohnflaeche-main")
-                    Expose.number_of_rooms = self.stealth_chrome.safe_find_element(By.CLASS_NAME, "is24qa-zi-main")
-                    Expose.nebekosten = self.stealth_chrome.safe_find_element(By.CLASS_NAME, "is24qa-nebenkosten")
-                    Expose.price_warm = self.stealth_chrome.safe_find_element(By.CSS_SELECTOR, "dd.is24qa-gesamtmiete")
-                    Expose.construction_year = self.stealth_chrome.safe_find_element(By.CLASS_NAME, "is24qa-baujahr")
-                    Expose.description = self.stealth_chrome.safe_find_element(By.CLASS_NAME, "is24qa-objektbeschreibung")
-                    Expose.neighborhood = self.stealth_chrome.safe_find_element(By.CLASS_NAME, "is24qa-lage")
+                    for field, value in fields.items():
+                        setattr(Expose, field, value)
                     Expose.scraped_at = datetime.utcnow()
                     logger.info(f"Expose {Expose.expose_id} scraped")
                     self.stealth_chrome.perform_random_action()
@@ -246,8 +320,8 @@ class Immobilienscout24_processor(BaseExposeProcessor):
             logger.info(f"Expose {Expose.expose_id} already scraped")
             return True
 
-    # Applies for an offer, updates the expose and returns boolean for success
-    def _apply_for_offer(self, Expose: Expose):
+    # Opens the contact form of the offer, returns boolean for success
+    def _open_application_form(self, Expose: Expose):
         logger.info("Trying application...")
         try:
             message_button = WebDriverWait(self.stealth_chrome, 10).until(
@@ -264,6 +338,7 @@ class Immobilienscout24_processor(BaseExposeProcessor):
 
         if "Welcome - ImmobilienScout24" in self.stealth_chrome.title:
             logger.info("User not logged in. Bad attempt")
+            self.failure_class = "login"
             return False
 
         #This happens if we are not logged in, or if we have not premium
@@ -286,11 +361,10 @@ class Immobilienscout24_processor(BaseExposeProcessor):
         except:
             logger.warning("Message pop-up did not open or message box not found, aborting application attempt")
             return False
+        return True
 
-        #And fill it
-        self._fill_application_form(Expose)
-        
-        # Submit the form
+    # Submits the filled contact form, returns boolean for success
+    def _submit_application(self):
         try:
             send_button = WebDriverWait(self.stealth_chrome, 10).until(
                 EC.presence_of_element_located((By.CSS_SELECTOR, "button[type='submit'].Button_button-primary__6QTnx"))
@@ -306,8 +380,10 @@ class Immobilienscout24_processor(BaseExposeProcessor):
         # sometimes we get a captcha
         captcha_handler = ImmoCaptchaHandler()
         captcha_handler.handle_captchas(self.stealth_chrome)
-            
-        # Validating submission
+        return True
+
+    # Validates the submission, updates the expose and returns boolean for success
+    def _confirm_application(self, Expose: Expose):
         try:
             confirmation_message = WebDriverWait(self.stealth_chrome, 10).until(
             EC.presence_of_element_located((By.XPATH, "//h2[text()='Nachricht gesendet']"))
@@ -336,20 +412,16 @@ class Immobilienscout24_processor(BaseExposeProcessor):
             )
         except Exception as e:
             logger.warning(f"Application form not fully loaded (or timed out): {e}")
-            return
+            return False
 
-        # 3) Get (visible) form fields
+        # 3) Get (visible) form fields, with name and type, in one round trip
+        discovery_start = time.perf_counter()
         visible_fields = self._get_all_visible_form_fields()
+        discovery_time = time.perf_counter() - discovery_start
 
         # Print them once for debugging
         for f in visible_fields:
-            field_name = f.get_attribute("name")
-            field_type_attr = f.get_attribute("type")
-            if f.tag_name.lower() == "select":
-                field_type = "select"
-            else:
-                field_type = field_type_attr.lower() if field_type_attr else f.tag_name.lower()
-            logger.debug(f"Found field: name={field_name}, type={field_type}")
+            logger.debug(f"Found field: name={f['name']}, type={f['type']}")
 
         #Fill fields
         form_values = [
@@ -396,45 +468,51 @@ class Immobilienscout24_processor(BaseExposeProcessor):
             ("insolvencyProcess", "select", os.getenv("APPLICANT_INSOLVENCY_PROCESS")),
         ]
 
-        for field in visible_fields:
-            field_name = field.get_attribute("name")
-            # Determine actual field type
-            if field.tag_name.lower() == "select":
-                field_type = "select"
-            else:
-                field_type_attr = field.get_attribute("type")
-                field_type = field_type_attr.lower() if field_type_attr else field.tag_name.lower()
-
-            for name, expected_type, value in form_values:
-                # Match field name and type
-                if field_name == name and field_type == expected_type:
-                    try:
-                        # Scroll this element into view before interacting
-                        self.stealth_chrome.execute_script("arguments[0].scrollIntoView({block: 'center'});", field)
-                        StealthBrowser.random_wait(0.2, 0.5)  # give time to settle
-                        self.stealth_chrome.random_mouse_movements(field)
-
-                        if field_type in ["text", "email", "tel", "number"] or field.tag_name.lower() == "textarea":
-                            field.clear()
-                            self.stealth_chrome.send_keys_human_like(field, value)
-
-                        elif field_type == "select":
-                            Select(field).select_by_visible_text(value)
-
-                        elif field_type == "checkbox":
-                            current_state = field.is_selected()
-                            if value.lower() in ["true", "yes", "1"] and not current_state:
-                                self.stealth_chrome.click_with_random_offset(field)
-                            elif value.lower() in ["false", "no", "0"] and current_state:
-                                self.stealth_chrome.click_with_random_offset(field)
-
-                    except Exception as e:
-                        logger.warning(f"Could not fill field '{field_name}' (type={field_type}). log debug for more details.")
-                        logger.debug(e)
-
+        # (name, type) -> value
+        form_lookup = {(name, expected_type): value for name, expected_type, value in form_values}
 
+        fill_start = time.perf_counter()
+        typing_start = self.stealth_chrome.typing_seconds
+        filled = 0
+        for field in visible_fields:
+            field_name = field["name"]
+            field_type = field["type"]
+            value = form_lookup.get((field_name, field_type))
+            if value is None:
+                continue
+            element = field["element"]
+            try:
+                # Scroll this element into view before interacting
+                self.stealth_chrome.execute_script("arguments[0].scrollIntoView({block: 'center'});", element)
+                StealthBrowser.random_wait(0.2, 0.5)  # give time to settle
+                self.stealth_chrome.random_mouse_movements(element)
+
+                if field_type in ["text", "email", "tel", "number", "textarea"]:
+                    element.clear()
+                    self.stealth_chrome.type_text(element, value)
+
+                elif field_type == "select":
+                    Select(element).select_by_visible_text(value)
+
+                elif field_type == "checkbox":
+                    current_state = field["checked"]
+                    if value.lower() in ["true", "yes", "1"] and not current_state:
+                        self.stealth_chrome.click_with_random_offset(element)
+                    elif value.lower() in ["false", "no", "0"] and current_state:
+                        self.stealth_chrome.click_with_random_offset(element)
+                filled += 1
+
+            except Exception as e:
+                logger.warning(f"Could not fill field '{field_name}' (type={field_type}). log debug for more details.")
+                logger.debug(e)
+
+        logger.info(
+            f"Filled {filled}/{len(visible_fields)} fields for {Expose.expose_id} in "
+            f"{time.perf_counter() - fill_start:.1f}s (field discovery {discovery_time * 1000:.0f}ms, "
+            f"typing {self.stealth_chrome.typing_seconds - typing_start:.1f}s with {self.stealth_chrome.typing_strategy} strategy)"
+        )
         logger.info("Form filling completed.")
-        return
+        return True
 
     # Scrolls the page in increments to ensure all dynamic content is fully loaded.
     def _scroll_in_increments(self):
@@ -447,21 +525,30 @@ class Immobilienscout24_processor(BaseExposeProcessor):
                 break
             last_height = new_height
 
-    #Return a list of only the visible input, textarea, and select fields. Hidden fields are skipped.
+    # Return descriptors {element, name, type, checked} of the visible input, textarea, and select fields.
+    # Hidden fields are skipped. type is "select" for selects, the type property (text, textarea, ...) otherwise.
     def _get_all_visible_form_fields(self):
-        all_inputs = self.stealth_chrome.find_elements(By.TAG_NAME, "input")
-        all_textareas = self.stealth_chrome.find_elements(By.TAG_NAME, "textarea")
-        all_selects = self.stealth_chrome.find_elements(By.TAG_NAME, "select")
-        
-        all_fields = all_inputs + all_textareas + all_selects
-        
-        visible_fields = []
-        for field in all_fields:
-            # skip hidden or invisible
-            if field.is_displayed() and field.get_attribute("type") != "hidden":
-                visible_fields.append(field)
-        
-        return visible_fields
+        return self.stealth_chrome.execute_script(
+            """
+            const fields = [];
+            for (const element of document.querySelectorAll("input, textarea, select")) {
+                const style = window.getComputedStyle(element);
+                const visible = element.getClientRects().length > 0
+                    && style.visibility !== "hidden" && style.display !== "none";
+                if (!visible || element.type === "hidden") {
+                    continue;
+                }
+                const tag = element.tagName.toLowerCase();
+                fields.push({
+                    element: element,
+                    name: element.getAttribute("name"),
+                    type: tag === "select" ? "select" : (element.type || tag).toLowerCase(),
+                    checked: Boolean(element.checked),
+                });
+            }
+            return fields;
+            """
+        )
 
     # Tries to accept cookies
     def _accept_cookies(self):
@@ -0,0 +1,63 @@
+import os
+import time
+import sqlite3
+import tempfile
+import threading
+from modules.Database import ExposeDB
+from modules.Expose import Expose
+
+
+class PerCallConnectionDB(ExposeDB):
+    # Previous behaviour: a brand new connection for every call, default journal
+    def _get_connection(self):
+        conn = sqlite3.connect(self.db_file)
+        # Rows are read by column name, as with the shared connections
+        conn.row_factory = sqlite3.Row
+        return conn
+
+
+def benchmark(db, label, calls=500):
+    db.clear_all_exposes()
+    db.insert_expose(Expose(expose_id="bench", source="Immobilienscout24"))
+    start = time.perf_counter()
+    for _ in range(calls):
+        db.expose_exists("bench")
+        db.get_expose("bench")
+    elapsed = time.perf_counter() - start
+    print(f"{label}: {elapsed / (calls * 2) * 1e6:.1f} us per call")
+
+
+def concurrent_writers(db, threads=4, exposes=200):
+    db.clear_all_exposes()
+    errors = []
+
+    def writer(worker):
+        try:
+            for i in range(exposes):
+                db.insert_new_exposes([(f"{worker}-{i}", "Immobilienscout24")])
+                db.get_unprocessed_exposes()
+        except sqlite3.OperationalError as e:
+            errors.append(e)
+
+    workers = [threading.Thread(target=writer, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    print(f"{threads} concurrent writers: {len(db.get_unprocessed_exposes())} exposes stored, {len(errors)} errors {errors[:1]}")
+
+
+def main():
+    print("Benchmarking ExposeDB connection handling...")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "bench.db")
+        # Never touch the real database, DB_FILE from .env would win over the argument
+        os.environ["DB_FILE"] = db_file
+        benchmark(PerCallConnectionDB(db_file), "Connection per call")
+        pooled = ExposeDB(db_file)
+        benchmark(pooled, "Pooled WAL connection")
+        concurrent_writers(pooled)
+        pooled.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import sys
+import time
+import tempfile
+from selenium.webdriver.support.ui import WebDriverWait
+from modules.StealthBrowser import StealthBrowser
+
+DEFAULT_URLS = ["https://www.immobilienscout24.de/"]
+
+
+def benchmark(urls, fast_load, rounds=3):
+    # Throwaway profile so the real one (and its cache) is not used
+    with tempfile.TemporaryDirectory() as profile_dir:
+        browser = StealthBrowser(profile_dir, debugging_port=9300, fast_load=fast_load)
+        try:
+            timings = []
+            resources = []
+            for _ in range(rounds):
+                for url in urls:
+                    start = time.perf_counter()
+                    browser.get(url)
+                    # Same readiness check as BaseExposeProcessor.process_expose
+                    WebDriverWait(browser, 30).until(lambda d: d.title.strip() != "")
+                    timings.append(time.perf_counter() - start)
+                    resources.append(browser.execute_script(
+                        "return performance.getEntriesByType('resource').length"
+                    ))
+        finally:
+            browser.kill()
+    label = "Fast load" if fast_load else "Default"
+    print(
+        f"{label}: page ready avg {sum(timings) / len(timings):.2f}s, "
+        f"max {max(timings):.2f}s, {sum(resources) / len(resources):.0f} resources per page"
+    )
+
+
+def main():
+    urls = sys.argv[1:] or DEFAULT_URLS
+    print(f"Benchmarking page ready time on {len(urls)} URLs...")
+    benchmark(urls, fast_load=False)
+    benchmark(urls, fast_load=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import os
+import sys
+import glob
+import time
+from modules.HtmlScraper import HtmlScraper
+
+# Pages saved by StealthBrowser.save_page
+DEFAULT_CORPUS = os.path.join("logs", "StealthBrowserCaptures", "*", "*_source.html")
+
+SAMPLE_PAGE = """
+<html><head><title>Wohnung</title><script>var t = "<h1 id='expose-title'>script</h1>";</script></head><body>
+<h1 id="expose-title"> Schöne 2-Zimmer-Wohnung &amp; Balkon </h1>
+<div class="zip-region-and-country">10965 Berlin, <span>Kreuzberg</span></div>
+<p data-qa="company-name">Hausverwaltung GmbH</p>
+<dl><dt>Gesamtmiete</dt><dd class="is24qa-gesamtmiete grid-item">1.200 €</dd></dl>
+<div class="is24qa-objektbeschreibung"><p>Hell und ruhig.<br>Ab sofort frei.</p></div>
+</body></html>
+"""
+
+
+def check_sample(scrape_fields):
+    fields = HtmlScraper.extract_fields(SAMPLE_PAGE, scrape_fields)
+    expected = {
+        "title": "Schöne 2-Zimmer-Wohnung & Balkon",
+        "location": "10965 Berlin, Kreuzberg",
+        "real_estate_agency": "Hausverwaltung GmbH",
+        "price_warm": "1.200 €",
+        "description": "Hell und ruhig.\nAb sofort frei.",
+        "construction_year": None,
+    }
+    for field, value in expected.items():
+        assert fields[field] == value, f"{field}: expected {value!r}, got {fields[field]!r}"
+    print("Sample page parsed correctly.")
+
+
+# Optional end tags left out, as on the listing pages
+UNCLOSED_PAGE = """
+<ul class="features"><li class="balcony">Balkon<li class="kitchen">Einbauküche<li>Keller</ul>
+<p class="intro">Erster Absatz<p class="second">Zweiter Absatz<div class="after">Danach</div>
+<dl><dt>Zimmer<dd class="rooms">2<dt>Fläche<dd class="area">55 m²</dl>
+<ul><li class="outer"><p>Text<li class="next">Nächster</ul>
+"""
+
+
+def check_unclosed_items():
+    fields = HtmlScraper.extract_fields(UNCLOSED_PAGE, {
+        "balcony": "li.balcony",
+        "kitchen": "li.kitchen",
+        "intro": "p.intro",
+        "second": "p.second",
+        "rooms": "dd.rooms",
+        "area": "dd.area",
+        "outer": "li.outer",
+        "next": "li.next",
+    })
+    expected = {
+        "balcony": "Balkon",
+        "kitchen": "Einbauküche",
+        "intro": "Erster Absatz",
+        "second": "Zweiter Absatz",
+        "rooms": "2",
+        "area": "55 m²",
+        "outer": "Text",
+        "next": "Nächster",
+    }
+    for field, value in expected.items():
+        assert fields[field] == value, f"{field}: expected {value!r}, got {fields[field]!r}"
+    print("Unclosed <li>/<p>/<dd> items closed implicitly.")
+
+
+def benchmark(files, scrape_fields, rounds=5):
+    pages = []
+    for file in files:
+        with open(file, "r", encoding="utf-8") as f:
+            pages.append(f.read())
+    for file, page in zip(files, pages):
+        fields = HtmlScraper.extract_fields(page, scrape_fields)
+        found = sum(1 for value in fields.values() if value is not None)
+        print(f"{file}: {found}/{len(fields)} fields, title: {fields.get('title')}")
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for page in pages:
+            HtmlScraper.extract_fields(page, scrape_fields)
+    elapsed = time.perf_counter() - start
+    megabytes = sum(len(page) for page in pages) * rounds / 1e6
+    print(f"Parsed {len(pages) * rounds / elapsed:.1f} pages/s ({megabytes / elapsed:.1f} MB/s)")
+
+
+def main():
+    # Needs the applicant settings from .env, like the processor itself
+    from modules.immobilienscout24_processor import Immobilienscout24_processor
+    scrape_fields = Immobilienscout24_processor.scrape_fields
+    check_sample(scrape_fields)
+    check_unclosed_items()
+    pattern = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CORPUS
+    files = sorted(glob.glob(pattern))
+    if not files:
+        print(f"No saved pages found in {pattern}")
+        return
+    print(f"Benchmarking HtmlScraper on {len(files)} saved pages...")
+    benchmark(files, scrape_fields)
+
+if __name__ == "__main__":
+    main()
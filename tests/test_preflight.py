@@ -0,0 +1,95 @@
+import os
+import json
+import time
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from modules.Expose import Expose
+
+# Stub listings: path -> (status, page title)
+STUB_PAGES = {
+    "/expose/live": (200, "2-Zimmer-Wohnung in Berlin | ImmoScout24"),
+    "/expose/expired": (200, "Angebot nicht gefunden | ImmoScout24"),
+    "/expose/deactivated": (200, "Angebot wurde deaktiviert | ImmoScout24"),
+    "/expose/gone": (404, "Seite nicht gefunden"),
+    "/expose/wall": (200, "Ich bin kein Roboter - ImmobilienScout24"),
+    "/expose/challenge": (405, "Human Verification"),
+    "/expose/broken": (500, "Internal Server Error"),
+}
+EXPECTED = {
+    "live": "live",
+    "expired": "expired",
+    "deactivated": "expired",
+    "gone": "expired",
+    "wall": "gated",
+    "challenge": "gated",
+    "broken": "unknown",
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    cookies_seen = []
+
+    def do_GET(self):
+        StubHandler.cookies_seen.append(self.headers.get("Cookie"))
+        status, title = STUB_PAGES.get(self.path, (404, "Seite nicht gefunden"))
+        body = f"<html><head><title>{title}</title></head><body><h1>{title}</h1></body></html>".encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    # Session snapshots go to a temporary COOKIES_DIR
+    os.environ["COOKIES_DIR"] = tempfile.mkdtemp()
+    # Needs the applicant settings from .env, like the processor itself
+    from modules.immobilienscout24_processor import Immobilienscout24_processor
+    from modules.SessionStore import SessionStore
+    from modules.HttpSession import HttpSession
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stub_url = f"http://127.0.0.1:{server.server_port}"
+
+    class StubProcessor(Immobilienscout24_processor):
+        _generate_expose_link = staticmethod(lambda Expose: f"{stub_url}/expose/{Expose.expose_id}")
+
+    # A stored browser session, its cookies must be sent with the pre-flight requests
+    session_store = SessionStore("Stub", "127.0.0.1", stub_url)
+    with open(session_store.session_file, "w", encoding="utf-8") as file:
+        json.dump({
+            "version": SessionStore.FORMAT_VERSION,
+            "site": "Stub",
+            "origin": stub_url,
+            "saved_at": "now",
+            "expires_at": time.time() + 60,
+            "cookies": [{"name": "reese84", "value": "token", "domain": "127.0.0.1", "path": "/"}],
+            "local_storage": {},
+        }, file)
+    http_session = HttpSession(session_store)
+
+    print("Testing pre-flight classification against a local stub...")
+    start_time = time.perf_counter()
+    for expose_id, expected in EXPECTED.items():
+        outcome = StubProcessor.preflight(Expose(expose_id=expose_id), http_session)
+        print(f"{expose_id}: {outcome}")
+        assert outcome == expected, f"{expose_id}: expected {expected}, got {outcome}"
+    elapsed = time.perf_counter() - start_time
+    print(f"{len(EXPECTED)} checks in {elapsed * 1000:.0f}ms over one pooled session")
+    assert all(cookie == "reese84=token" for cookie in StubHandler.cookies_seen), StubHandler.cookies_seen
+    print("Stored session cookies sent with every request.")
+
+    # Server down: the browser must still get the expose
+    server.shutdown()
+    server.server_close()
+    assert StubProcessor.preflight(Expose(expose_id="live"), http_session) == "unknown"
+    http_session.close()
+    print("All pre-flight checks passed.")
+
+if __name__ == "__main__":
+    main()